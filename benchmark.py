@@ -0,0 +1,440 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+
+import httpx
+
+try:
+    from PIL import Image
+except ImportError:  # media falls back to random bytes
+    Image = None
+
+# Reproducible load test for the write and listing endpoints.
+#
+#   python benchmark.py --seed-posts 200 --requests 500 --concurrency 20 \
+#       --output results.json --baseline baseline.json
+#
+# By default it boots `uvicorn main:app` in a temporary directory against
+# the SQLite stand-in (DB_BACKEND=sqlite, see localdb.py), seeds posts with
+# realistically sized media through /upload-post, then drives each scenario
+# with concurrent async clients. Pass --base-url to benchmark an already
+# running server instead. With --baseline the run fails (exit code 1) if
+# any scenario's throughput drops or p95 latency rises by more than
+# --max-regression compared to the baseline results file.
+#
+# Every scenario also reports the response bytes that went over the wire
+# versus their decoded size (bytes_saved is what compression saved), and,
+# for a server the script booted itself, the server's CPU time per request.
+# Run once with --accept-encoding identity to get the uncompressed figures
+# to compare against.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ("get-posts", "upload-post", "update-post", "delete-post")
+
+KB = 1024
+
+# Rough sizes of real uploads: a thumbnail, a hero banner and a long article
+MEDIA_SIZES = {"thumbnail": 40 * KB, "banner": 250 * KB, "markdown": 8 * KB}
+
+WORDS = (
+    "cache index query latency thread pool cursor async event loop buffer stream "
+    "python markdown render image banner tutorial guide article request response"
+).split()
+
+
+def make_image(target_bytes, rng):
+    """A JPEG of roughly target_bytes, or random bytes when Pillow is missing."""
+    if Image is None:
+        return rng.randbytes(target_bytes), "image/jpeg"
+    # Noise compresses to ~0.8 bytes per pixel at quality 85
+    side = max(16, int((target_bytes / 0.8) ** 0.5))
+    image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def make_markdown(target_bytes, rng):
+    lines = []
+    size = 0
+    while size < target_bytes:
+        if rng.random() < 0.1:
+            line = "## " + " ".join(rng.choices(WORDS, k=4)).title()
+        else:
+            line = " ".join(rng.choices(WORDS, k=rng.randint(12, 30))) + "."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n\n".join(lines).encode("utf-8")
+
+
+class Media:
+    """Pre-generated upload bodies, so payload generation is not measured."""
+
+    def __init__(self, scale=1.0, seed=0):
+        rng = random.Random(seed)
+        self.thumbnail = make_image(int(MEDIA_SIZES["thumbnail"] * scale), rng)
+        self.banner = make_image(int(MEDIA_SIZES["banner"] * scale), rng)
+        self.markdown = make_markdown(int(MEDIA_SIZES["markdown"] * scale), rng)
+        self.rng = rng
+
+    def upload_form(self, index):
+        text_data = {
+            "title": f"Benchmark post {index} " + " ".join(self.rng.choices(WORDS, k=3)),
+            "description": " ".join(self.rng.choices(WORDS, k=20)),
+            "author": self.rng.choice(("ada", "grace", "linus", "guido")),
+        }
+        files = {
+            "thumbnail": ("thumbnail.jpg", self.thumbnail[0], self.thumbnail[1]),
+            "banner": ("banner.jpg", self.banner[0], self.banner[1]),
+            "markdown": ("post.md", self.markdown, "text/markdown"),
+        }
+        return {"text_data": json.dumps(text_data)}, files
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process so far (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are the 12th and 13th
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def summarize(name, results, elapsed, concurrency, rate, cpu=None):
+    latencies = sorted(latency for _, latency, _, _ in results)
+    statuses = Counter(status for status, _, _, _ in results)
+    errors = sum(count for status, count in statuses.items() if not (200 <= status < 400))
+    wire_bytes = sum(wire for _, _, wire, _ in results)
+    decoded_bytes = sum(decoded for _, _, _, decoded in results)
+    return {
+        "scenario": name,
+        "requests": len(results),
+        "concurrency": concurrency,
+        "target_rate": rate or None,
+        "errors": errors,
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(results) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        "response_bytes": decoded_bytes,
+        "wire_bytes": wire_bytes,
+        "bytes_saved": decoded_bytes - wire_bytes,
+        "wire_bytes_per_request": round(wire_bytes / len(results)) if results else None,
+        "server_cpu_ms_per_request": round(cpu * 1000 / len(results), 3) if cpu is not None and results else None,
+    }
+
+
+async def drive(name, send, total, concurrency, rate=0, server_pid=None):
+    """
+    Issue `total` calls of send(i) from `concurrency` workers. With a rate,
+    request i is not started before start + i / rate (open loop); otherwise
+    workers go as fast as responses come back (closed loop). send(i) returns
+    the httpx.Response, or just a status code.
+
+    Returns:
+    - dict: summary from summarize()
+    """
+    results = []
+    next_index = 0
+    cpu_started = cpu_seconds(server_pid) if server_pid else None
+    started = time.perf_counter()
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            if rate:
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            request_started = time.perf_counter()
+            wire = decoded = 0
+            try:
+                response = await send(index)
+            except httpx.HTTPError:
+                response = 599
+            if isinstance(response, httpx.Response):
+                # num_bytes_downloaded counts the body as sent, before decompression
+                status, wire, decoded = response.status_code, response.num_bytes_downloaded, len(response.content)
+            else:
+                status = response
+            results.append((status, time.perf_counter() - request_started, wire, decoded))
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total) or 1)))
+    elapsed = time.perf_counter() - started
+    cpu = None
+    if cpu_started is not None:
+        cpu_finished = cpu_seconds(server_pid)
+        cpu = cpu_finished - cpu_started if cpu_finished is not None else None
+    return summarize(name, results, elapsed, concurrency, rate, cpu)
+
+
+async def upload(client, post_type, media, index):
+    data, files = media.upload_form(index)
+    response = await client.post(f"/upload-post/{post_type}", data=data, files=files)
+    post_id = response.json().get(f"{post_type}_id") if response.status_code == 200 else None
+    return response, post_id
+
+
+async def seed(client, post_type, media, count, concurrency):
+    post_ids = []
+
+    async def send(index):
+        response, post_id = await upload(client, post_type, media, index)
+        if post_id:
+            post_ids.append(post_id)
+        return response
+
+    summary = await drive("seed", send, count, concurrency)
+    return post_ids, summary
+
+
+async def collect_cursors(client, post_type, limit):
+    cursors = [None]
+    while True:
+        params = {"limit": limit}
+        if cursors[-1]:
+            params["cursor"] = cursors[-1]
+        response = await client.get(f"/get-posts/{post_type}", params=params)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if response.status_code != 200 or not next_cursor:
+            return cursors
+        cursors.append(next_cursor)
+
+
+async def run_scenarios(base_url, args, media, server_pid=None):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    # httpx offers every coding it can decode unless told otherwise
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else None
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits, headers=headers) as client:
+        post_type = args.post_type
+        post_ids, seed_summary = await seed(client, post_type, media, args.seed_posts, args.concurrency)
+        scenarios = {}
+
+        for name in args.scenarios:
+            if name == "get-posts":
+                cursors = await collect_cursors(client, post_type, args.page_size)
+
+                async def send(index):
+                    params = {"limit": args.page_size}
+                    cursor = cursors[index % len(cursors)]
+                    if cursor:
+                        params["cursor"] = cursor
+                    if args.inline_thumbnails:
+                        params["inline_thumbnails"] = "true"
+                    return await client.get(f"/get-posts/{post_type}", params=params)
+
+            elif name == "upload-post":
+                async def send(index):
+                    response, post_id = await upload(client, post_type, media, args.seed_posts + index)
+                    if post_id:
+                        post_ids.append(post_id)
+                    return response
+
+            elif name == "update-post":
+                if not post_ids:
+                    continue
+
+                async def send(index):
+                    post_id = post_ids[index % len(post_ids)]
+                    return await client.post(
+                        f"/update-post/{post_type}/title/{post_id}", params={"value": f"Updated title {index}"}
+                    )
+
+            elif name == "delete-post":
+                # Deletes are destructive, so they can only run once per post
+                victims = list(post_ids)
+
+                async def send(index):
+                    response = await client.delete(f"/delete-post/{post_type}/{victims[index]}")
+                    return response if response.json().get("status") != "Error" else 500
+
+                scenarios[name] = await drive(
+                    name, send, min(args.requests, len(victims)), args.concurrency, args.rate, server_pid
+                )
+                continue
+
+            scenarios[name] = await drive(name, send, args.requests, args.concurrency, args.rate, server_pid)
+        return seed_summary, scenarios
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def boot_server(workdir, port, extra_env=None):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "DB_BACKEND": "sqlite",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env or {})
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health/db", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not become healthy within 30s")
+
+
+def compare(results, baseline, max_regression):
+    """
+    Returns:
+    - list: human-readable regressions of results versus baseline
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        # Throughput of a rate-limited run only reflects the target rate
+        open_loop = current.get("target_rate") or previous.get("target_rate")
+        if not open_loop and previous.get("requests_per_s") and current.get("requests_per_s") is not None:
+            if current["requests_per_s"] < previous["requests_per_s"] * (1 - max_regression):
+                regressions.append(
+                    f"{name}: throughput {current['requests_per_s']}/s < baseline {previous['requests_per_s']}/s"
+                )
+        if previous.get("p95_ms") and current.get("p95_ms") is not None:
+            if current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+                regressions.append(f"{name}: p95 {current['p95_ms']} ms > baseline {previous['p95_ms']} ms")
+        if previous.get("wire_bytes_per_request") and current.get("wire_bytes_per_request") is not None:
+            if current["wire_bytes_per_request"] > previous["wire_bytes_per_request"] * (1 + max_regression):
+                regressions.append(
+                    f"{name}: {current['wire_bytes_per_request']} bytes/request on the wire > "
+                    f"baseline {previous['wire_bytes_per_request']}"
+                )
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors, baseline had {previous.get('errors', 0)}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark upload, update, delete and listing endpoints")
+    parser.add_argument("--base-url", help="benchmark a running server instead of booting one")
+    parser.add_argument("--post-type", default="articles")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed-posts", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=0, help="target requests/s per scenario; 0 = closed loop")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--inline-thumbnails", action="store_true",
+                        help="get-posts embeds thumbnails as base64, the largest listing bodies")
+    parser.add_argument("--accept-encoding",
+                        help="Accept-Encoding to send, e.g. identity to measure without compression")
+    parser.add_argument("--media-scale", type=float, default=1.0, help="multiply the default media sizes")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed fractional drop in throughput / rise in p95 (default 0.2)")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    media = Media(args.media_scale)
+    server = None
+    workdir = None
+    try:
+        if args.base_url:
+            base_url = args.base_url.rstrip("/")
+        else:
+            workdir = tempfile.TemporaryDirectory(prefix="benchmark-")
+            port = free_port()
+            server = boot_server(workdir.name, port)
+            base_url = f"http://127.0.0.1:{port}"
+
+        seed_summary, scenarios = asyncio.run(run_scenarios(base_url, args, media, server.pid if server else None))
+        results = {
+            "label": args.label,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                key: value for key, value in vars(args).items() if key not in ("output", "baseline", "label")
+            },
+            "media_bytes": {
+                "thumbnail": len(media.thumbnail[0]),
+                "banner": len(media.banner[0]),
+                "markdown": len(media.markdown),
+            },
+            "seed": seed_summary,
+            "scenarios": scenarios,
+            "server": {"peak_rss_mb": peak_rss_mb(server.pid) if server else None},
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if workdir is not None:
+            workdir.cleanup()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("Regressions against baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
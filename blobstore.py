@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import logging
+import time
+import uuid
+import hashlib
+import threading
+
+from storage import iter_post_dirs
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed media store. Each distinct file body is kept once under
+# uploads/blobs/<aa>/<bb>/<sha256>; the files in post folders and the
+# thumbnails directory are hard links to those blobs, so existing readers keep
+# working unchanged. A blob's reference count is its link count minus one,
+# and each post records which digests it references in media.refs.json so
+# delete_post can release them immediately. `python blobstore.py gc` sweeps
+# anything left unreferenced (e.g. after a crash).
+
+REFS_FILENAME = "media.refs.json"
+GC_MIN_AGE = int(os.getenv("BLOB_GC_MIN_AGE", "3600"))
+
+_refs_lock = threading.Lock()
+
+
+def blobs_root():
+    return os.path.abspath(os.path.join(os.getcwd(), "uploads", "blobs"))
+
+
+def blob_path(digest):
+    return os.path.join(blobs_root(), digest[:2], digest[2:4], digest)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ingest(path, digest):
+    """
+    Deduplicate the file at `path` (whose sha256 is `digest`) against the store.
+    If the blob exists, `path` is atomically replaced by a link to it;
+    otherwise `path` becomes the blob. Falls back to leaving the file alone
+    on filesystems without hard links.
+
+    Returns:
+    - bool: True if the file is now backed by the store
+    """
+    target = blob_path(digest)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    for _ in range(3):
+        try:
+            if os.path.samefile(target, path):
+                # Already a link to the blob; renaming a link over another link to the same file is a no-op
+                return True
+            tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+            os.link(target, tmp_path)
+            os.replace(tmp_path, path)
+            return True
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Blob store unavailable for %s: %s", path, e)
+            return False
+        try:
+            os.link(path, target)
+            return True
+        except FileExistsError:
+            # Another upload stored the same bytes first; link to theirs
+            continue
+        except OSError as e:
+            logger.warning("Blob store unavailable for %s: %s", path, e)
+            return False
+    return False
+
+
+def read_refs(post_folder):
+    try:
+        with open(os.path.join(post_folder, REFS_FILENAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def record_ref(post_folder, field, digest):
+    """
+    Record that the post's `field` (thumbnail, banner, video) now points at digest.
+
+    Returns:
+    - Optional[str]: the digest it pointed at before, if any
+    """
+    with _refs_lock:
+        refs = read_refs(post_folder)
+        previous = refs.get(field)
+        refs[field] = digest
+        tmp_path = os.path.join(post_folder, f"{REFS_FILENAME}.{uuid.uuid4().hex}.part")
+        with open(tmp_path, "w") as f:
+            json.dump(refs, f)
+        os.replace(tmp_path, os.path.join(post_folder, REFS_FILENAME))
+    return previous
+
+
+def release(digest):
+    """Remove the blob if no post file links to it any more."""
+    if not digest:
+        return False
+    target = blob_path(digest)
+    try:
+        if os.stat(target).st_nlink <= 1:
+            os.remove(target)
+            return True
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def collect_garbage(min_age=GC_MIN_AGE):
+    """
+    Remove unreferenced blobs older than min_age seconds. The age guard keeps
+    the sweep away from blobs an in-flight upload has just created.
+
+    Returns:
+    - int: number of blobs removed
+    """
+    removed = 0
+    cutoff = time.time() - min_age
+    root = blobs_root()
+    if not os.path.isdir(root):
+        return 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat_result.st_nlink <= 1 and stat_result.st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def import_existing(post_types=("articles", "guides", "tutorials")):
+    """Move an existing uploads/ tree onto the blob store."""
+    uploads_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
+    saved = 0
+    for post_type in post_types:
+        type_dir = os.path.join(uploads_dir, post_type)
+        if not os.path.isdir(type_dir):
+            continue
+        for post_folder in iter_post_dirs(type_dir):
+            for file in os.listdir(post_folder):
+                field = file.split(".")[0]
+                if field in ("banner", "video") and not file.endswith(".part"):
+                    path = os.path.join(post_folder, file)
+                    digest = hash_file(path)
+                    if os.path.exists(blob_path(digest)):
+                        saved += os.path.getsize(path)
+                    if ingest(path, digest):
+                        record_ref(post_folder, field, digest)
+    thumbnails_dir = os.path.join(uploads_dir, "thumbnails")
+    for dirpath, dirnames, filenames in os.walk(thumbnails_dir):
+        if dirpath == thumbnails_dir and "renditions" in dirnames:
+            dirnames.remove("renditions")
+        for name in filenames:
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(dirpath, name)
+            digest = hash_file(path)
+            if os.path.exists(blob_path(digest)):
+                saved += os.path.getsize(path)
+            ingest(path, digest)
+    return saved
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "gc":
+        print(f"Removed {collect_garbage()} unreferenced blobs")
+    elif command == "import":
+        print(f"Deduplicated {import_existing()} bytes")
+    else:
+        print("Usage: python blobstore.py [gc|import]")
+        sys.exit(1)
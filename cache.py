@@ -0,0 +1,298 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+import responses
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryBackend:
+    """
+    In-process LRU bounded by entry count and total value size, with per-entry TTL.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._size += len(value)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._size, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """
+    Backend over any client exposing the redis-py get/set(ex=)/delete/incr calls,
+    e.g. redis.Redis or FakeRedis below. Eviction is left to the server's maxmemory policy.
+    """
+
+    # Generations live on the server, so every worker sees an invalidation
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key):
+        return int(self.client.incr(key))
+
+    def get_counter(self, key):
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def stats(self):
+        return {}
+
+
+class FakeRedis:
+    """
+    Minimal in-memory stand-in for a Redis client, for local runs and tests.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._data[key] if self._alive(key) else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = value if isinstance(value, bytes) else str(value).encode()
+            if ex is not None:
+                self._expiry[key] = time.monotonic() + ex
+            else:
+                self._expiry.pop(key, None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    del self._data[key]
+                    self._expiry.pop(key, None)
+                    removed += 1
+            return removed
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data[key]) + 1 if self._alive(key) else 1
+            self._data[key] = str(value).encode()
+            return value
+
+
+class ResponseCache:
+    """
+    Read-through cache for listing responses.
+
+    Keys embed a per-post-type generation number; invalidate(post_type) bumps
+    it, which makes every cached page of that type unreachable at once without
+    scanning keys. Concurrent misses on the same key share one load, and a
+    load that raises is not cached. With an in-process backend and several
+    workers, attach_bus() forwards each invalidation to the other workers'
+    caches. Calls to a shared (network) backend run on the threadpool so they
+    never block the event loop.
+    """
+
+    CHANNEL = "cache.invalidate"
+
+    def __init__(self, backend, ttl=CACHE_TTL, namespace="listing"):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._inflight = {}
+        self._bus = None
+        self._listeners = []
+
+    def attach_bus(self, bus):
+        if getattr(self.backend, "shared", False):
+            return
+        self._bus = bus
+        bus.subscribe(self.CHANNEL, self._apply_invalidation)
+
+    def add_listener(self, callback):
+        """
+        callback(post_type) runs after every invalidation: on the caller's thread for
+        local ones, on the bus thread for ones forwarded from other workers.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, post_type):
+        for callback in self._listeners:
+            try:
+                callback(post_type)
+            except Exception:
+                # A listener must never fail the write that invalidated
+                pass
+
+    def _apply_invalidation(self, message):
+        if message.get("namespace") == self.namespace:
+            self.backend.incr(self._generation_key(message["post_type"]))
+            self._notify(message["post_type"])
+
+    def _generation_key(self, post_type):
+        return f"{self.namespace}:gen:{post_type}"
+
+    async def _backend_call(self, method, *args):
+        if getattr(self.backend, "shared", False):
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    def generation(self, post_type):
+        """Changes whenever post_type is invalidated, in any worker. Blocking; see current_generation()."""
+        return self.backend.get_counter(self._generation_key(post_type))
+
+    async def current_generation(self, post_type):
+        return await self._backend_call(self.generation, post_type)
+
+    async def make_key(self, post_type, *parts):
+        generation = await self.current_generation(post_type)
+        return f"{self.namespace}:{post_type}:{generation}:" + ":".join(str(part) for part in parts)
+
+    async def get_or_load(self, post_type, key_parts, loader):
+        """
+        Parameters:
+        - post_type: str
+        - key_parts: tuple (everything else that distinguishes the response)
+        - loader: async callable returning a JSON-serialisable value
+
+        Returns:
+        - the cached or freshly loaded value
+        """
+        key = await self.make_key(post_type, *key_parts)
+        cached = await self._backend_call(self.backend.get, key)
+        if cached is not None:
+            self.hits += 1
+            return responses.loads(cached)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            await self._backend_call(self.backend.set, key, responses.dumps(value), self.ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unobserved error is not logged
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def invalidate(self, post_type):
+        self.invalidations += 1
+        await self._backend_call(self.backend.incr, self._generation_key(post_type))
+        if self._bus is not None:
+            try:
+                self._bus.publish(self.CHANNEL, {"namespace": self.namespace, "post_type": post_type})
+            except Exception:
+                # Other workers still expire the entries after ttl seconds
+                pass
+        self._notify(post_type)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            **self.backend.stats(),
+        }
+
+
+def create_backend(name=CACHE_BACKEND):
+    if name == "redis":
+        import redis
+        return RedisBackend(redis.Redis.from_url(REDIS_URL))
+    if name == "fakeredis":
+        return RedisBackend(FakeRedis())
+    return MemoryBackend()
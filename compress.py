@@ -0,0 +1,236 @@
+import os
+import time
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional; br is then never offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional; zstd is then never offered
+    zstandard = None
+
+# On-the-fly compression of response bodies, negotiated per request from
+# Accept-Encoding: zstd, then br, then gzip, limited to the libraries that
+# are installed (gzip always is). A response is left alone when
+#   - it is smaller than COMPRESS_MIN_BYTES, where the headers cost more
+#     than compression saves,
+#   - it already has a Content-Encoding (listing snapshots are sent
+#     pre-compressed, see snapshots.py),
+#   - its type is not in COMPRESSIBLE_TYPES: images, video, audio and
+#     archives are compressed already and would only cost CPU,
+#   - it answers a Range request or is a 204, 206 or 304.
+# Streamed bodies (NDJSON exports, markdown files) are compressed chunk by
+# chunk and flushed, so clients still see rows as they are produced. Large
+# bodies are compressed on the threadpool so the event loop keeps serving.
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_THREAD_BYTES = int(os.getenv("COMPRESS_THREAD_BYTES", str(256 * 1024)))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+COMPRESS_CODINGS = [
+    coding for coding in os.getenv("COMPRESS_CODINGS", "zstd,br,gzip").split(",")
+    if coding == "gzip" or (coding == "br" and brotli is not None) or (coding == "zstd" and zstandard is not None)
+]
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/vnd.apple.mpegurl",
+    "image/svg+xml",
+)
+SKIPPED_STATUSES = (204, 206, 304)
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Returns:
+    - set: codings the client accepts with a non-zero q value
+    """
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def negotiate(accept_encoding, codings=None):
+    """
+    Returns:
+    - Optional[str]: the preferred coding the client accepts, or None to send the body as is
+    """
+    accepted = accepted_encodings(accept_encoding)
+    for coding in COMPRESS_CODINGS if codings is None else codings:
+        if coding in accepted:
+            return coding
+    if "*" in accepted and "gzip" in (COMPRESS_CODINGS if codings is None else codings):
+        return "gzip"
+    return None
+
+
+def compressible(content_type):
+    content_type = (content_type or "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.split(";")[0].endswith(("+json", "+xml"))
+
+
+class Encoder:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, coding):
+        self.coding = coding
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        if coding == "gzip":
+            self._compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif coding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        elif coding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=COMPRESS_ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported coding '{coding}'")
+
+    def encode(self, data, final):
+        """
+        Returns:
+        - bytes: compressed output for data; everything so far is flushed, and the stream is ended when final
+        """
+        started = time.thread_time()
+        compressor = self._compressor
+        if self.coding == "gzip":
+            out = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        elif self.coding == "br":
+            out = compressor.process(data) + (compressor.finish() if final else compressor.flush())
+        else:
+            out = compressor.compress(data) + compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        self.cpu_seconds += time.thread_time() - started
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def record(self):
+        metrics.HTTP_COMPRESSION_BYTES.inc(self.bytes_in, self.coding, "in")
+        metrics.HTTP_COMPRESSION_BYTES.inc(self.bytes_out, self.coding, "out")
+        metrics.HTTP_COMPRESSION_SECONDS.inc(self.cpu_seconds, self.coding)
+
+
+class CompressionMiddleware:
+    """
+    Plain ASGI, so streamed responses are compressed as they are sent
+    rather than buffered.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        coding = negotiate(headers.get("accept-encoding"))
+        if coding is None or "range" in headers:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSend(send, coding, self.minimum_size))
+
+
+class _CompressingSend:
+    """
+    The send callable for one response. The start message is held back
+    until the first body message shows whether the body is worth compressing.
+    """
+
+    def __init__(self, send, coding, minimum_size):
+        self.send = send
+        self.coding = coding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            return await self.send(message)
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if self.encoder is not None:
+            if message["type"] == "http.response.body":
+                await self._send_encoded(message)
+            else:
+                await self.send(message)
+            return
+        await self._first_body(message)
+
+    async def _first_body(self, message):
+        start = self.start
+        headers = MutableHeaders(raw=list(start.get("headers", ())))
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        content_length = headers.get("content-length")
+        eligible = (
+            message["type"] == "http.response.body"
+            and 200 <= start["status"] and start["status"] not in SKIPPED_STATUSES
+            and "content-encoding" not in headers
+            and compressible(headers.get("content-type"))
+            and (len(body) if not more_body else int(content_length or self.minimum_size)) >= self.minimum_size
+        )
+        if not eligible:
+            self.passthrough = True
+            await self.send(start)
+            await self.send(message)
+            return
+
+        self.encoder = Encoder(self.coding)
+        if not more_body:
+            compressed = await self._encode(body, True)
+            if len(compressed) >= len(body):
+                # Random-looking text; the original is smaller
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            message = {**message, "body": compressed}
+            headers["Content-Length"] = str(len(compressed))
+        else:
+            message = {**message, "body": await self._encode(body, False)}
+            del headers["Content-Length"]
+        headers["Content-Encoding"] = self.coding
+        headers.add_vary_header("Accept-Encoding")
+        await self.send({**start, "headers": headers.raw})
+        await self.send(message)
+        if not more_body:
+            self.encoder.record()
+
+    async def _send_encoded(self, message):
+        more_body = message.get("more_body", False)
+        body = await self._encode(message.get("body", b""), not more_body)
+        await self.send({**message, "body": body})
+        if not more_body:
+            self.encoder.record()
+
+    async def _encode(self, data, final):
+        if len(data) >= COMPRESS_THREAD_BYTES:
+            return await run_in_threadpool(self.encoder.encode, data, final)
+        return self.encoder.encode(data, final)
@@ -0,0 +1,396 @@
+import io
+import os
+import sys
+import json
+import queue
+import shutil
+import tarfile
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+import search
+import blobstore
+import posttypes
+from functions import (
+    get_post_page_mysql, bulk_insert_posts_mysql, existing_post_ids_mysql, existing_thumbnail_ids_mysql,
+    encode_cursor, call_db, ThumbnailIndex,
+)
+
+# Streams a whole post type to or from a tar archive. Each post becomes
+#   <post_id>/row.json        the database row, plus the resume cursor
+#   <post_id>/thumbnail<ext>
+#   <post_id>/<file>          markdown.md, banner.*, video.*
+# Derived files (rendered HTML, renditions, hashes, blob refs) are skipped
+# and rebuilt on the receiving side.
+#
+#   python corpus.py export articles articles.tar [--cursor C]
+#   python corpus.py import articles articles.tar
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "200"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "8"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+STREAM_QUEUE_CHUNKS = 64
+# How often a side blocked on a full queue checks whether the other gave up
+STREAM_POLL_SECONDS = 1.0
+
+SKIPPED_FILES = (blobstore.REFS_FILENAME, "markdown.sha256")
+
+logger = logging.getLogger(__name__)
+
+
+class StreamClosed(Exception):
+    """The reading side of a chunk queue went away."""
+
+
+class _ChunkQueue(queue.Queue):
+    """
+    Bounded queue of stream chunks. Once `stopped` is set, by whichever side
+    gives up first, blocked and later puts are abandoned instead of waiting
+    forever on a queue nobody drains.
+    """
+
+    def __init__(self):
+        super().__init__(maxsize=STREAM_QUEUE_CHUNKS)
+        self.stopped = threading.Event()
+
+    def offer(self, item):
+        """
+        Returns:
+        - bool: True if item was queued, False if the queue was stopped first
+        """
+        while not self.stopped.is_set():
+            try:
+                self.put(item, timeout=STREAM_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+class _QueueWriter:
+    """File-like sink that hands every write to a bounded queue."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def write(self, data):
+        if data and not self.chunks.offer(bytes(data)):
+            raise StreamClosed("Archive stream closed by the reader")
+        return len(data)
+
+
+class _QueueReader:
+    """File-like source fed chunk by chunk from a bounded queue; None marks the end."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b""
+        self.finished = False
+
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.finished = True
+            else:
+                self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def _exportable_files(post_folder):
+    for file in sorted(os.listdir(post_folder)):
+        path = os.path.join(post_folder, file)
+        if not os.path.isfile(path) or file in SKIPPED_FILES or file.endswith((".part", ".html")):
+            continue
+        yield file, path
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, fileobj=io.BytesIO(data))
+
+
+def write_archive(fileobj, post_type, cursor=None, thumbnail_index=None):
+    """
+    Write every post of post_type, newest first starting after `cursor`, to
+    fileobj as an uncompressed tar stream. Only one page of rows and one
+    tar block are held in memory at a time.
+
+    Returns:
+    - int: number of posts written
+    """
+    thumbnail_index = thumbnail_index or ThumbnailIndex(storage.thumbnails_root())
+    written = 0
+    with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        while True:
+            rows, next_cursor = call_db(get_post_page_mysql, post_type, limit=EXPORT_PAGE_SIZE, cursor=cursor)
+            for row in rows:
+                post_id = row["id"]
+                record = {
+                    "id": post_id,
+                    "title": row["title"],
+                    "description": row["description"],
+                    "author": row["author"],
+                    "thumbnail": row["thumbnail"],
+                    "upload_date": str(row["created_at"]),
+                    "changes_date": str(row["updated_at"]) if row["updated_at"] else None,
+                    "cursor": encode_cursor(row["created_at"], post_id),
+                }
+                _add_bytes(tar, f"{post_id}/row.json", json.dumps(record).encode("utf-8"))
+
+                thumbnail_path = thumbnail_index.path(row["thumbnail"]) if row["thumbnail"] else None
+                if thumbnail_path and os.path.isfile(thumbnail_path):
+                    tar.add(thumbnail_path, f"{post_id}/thumbnail{os.path.splitext(thumbnail_path)[1]}")
+
+                post_folder = storage.post_dir(post_type, post_id)
+                if os.path.isdir(post_folder):
+                    for file, path in _exportable_files(post_folder):
+                        tar.add(path, f"{post_id}/{file}")
+                written += 1
+            if not next_cursor:
+                break
+            cursor = next_cursor
+    return written
+
+
+def stream_archive(post_type, cursor=None, thumbnail_index=None):
+    """
+    Generator over the tar bytes of write_archive(). The archive is produced
+    by a writer thread into a bounded queue, so memory stays constant no
+    matter how large the corpus or its videos are.
+    """
+    chunks = _ChunkQueue()
+    errors = []
+
+    def produce():
+        try:
+            write_archive(_QueueWriter(chunks), post_type, cursor, thumbnail_index)
+        except StreamClosed:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunks.offer(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Also on GeneratorExit when the client disconnects: releases the writer
+        chunks.stopped.set()
+    if errors:
+        raise errors[0]
+
+
+def _prepare_post(post_type, staging_dir):
+    """
+    Deduplicate a staged post's media against the blob store. Runs on an
+    import worker; nothing is visible to readers yet.
+
+    Returns:
+    - Optional[str]: name of the staged thumbnail file
+    """
+    os.remove(os.path.join(staging_dir, "row.json"))
+    thumbnail_file = None
+    for file in os.listdir(staging_dir):
+        field = file.split(".")[0]
+        if field == "thumbnail":
+            thumbnail_file = file
+        elif field in ("banner", "video"):
+            path = os.path.join(staging_dir, file)
+            digest = blobstore.hash_file(path)
+            blobstore.ingest(path, digest)
+            blobstore.record_ref(staging_dir, field, digest)
+    return thumbnail_file
+
+
+def _publish_post(post_type, staging_dir, record, thumbnail_file, taken_thumbnails):
+    """
+    Move a prepared post into place. Files already there without a row are
+    leftovers of an interrupted import and are replaced.
+
+    Parameters:
+    - taken_thumbnails: set - thumbnail IDs used by rows in the database or earlier in the batch
+
+    Returns:
+    - tuple: (post folder, thumbnail path or None, thumbnail relpath or None), for _unpublish_post
+
+    Raises:
+    - FileExistsError: If the post's thumbnail ID is taken by a post already in the database
+    """
+    post_id = record["id"]
+    thumbnail_id = record.get("thumbnail") if thumbnail_file else None
+    thumbnail_path = thumbnail_relpath = None
+    if thumbnail_id:
+        if thumbnail_id in taken_thumbnails:
+            raise FileExistsError(f"Thumbnail {thumbnail_id} already belongs to another post")
+        taken_thumbnails.add(thumbnail_id)
+        leftover = storage.find_thumbnail(thumbnail_id)
+        if leftover:
+            os.remove(os.path.join(storage.thumbnails_root(), leftover))
+        extension = os.path.splitext(thumbnail_file)[1]
+        thumbnail_path = storage.thumbnail_path(thumbnail_id, extension)
+        thumbnail_relpath = storage.thumbnail_relpath(thumbnail_id, extension)
+        os.replace(os.path.join(staging_dir, thumbnail_file), thumbnail_path)
+        blobstore.ingest(thumbnail_path, blobstore.hash_file(thumbnail_path))
+
+    existing = storage.post_dir(post_type, post_id)
+    if os.path.exists(existing):
+        shutil.rmtree(existing)
+    target = storage.sharded_post_dir(post_type, post_id)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.rename(staging_dir, target)
+    return target, thumbnail_path, thumbnail_relpath
+
+
+def _unpublish_post(published):
+    target, thumbnail_path, _ = published
+    shutil.rmtree(target, ignore_errors=True)
+    if thumbnail_path and os.path.exists(thumbnail_path):
+        os.remove(thumbnail_path)
+
+
+def read_archive(fileobj, post_type, thumbnail_index=None, workers=IMPORT_WORKERS):
+    """
+    Restore posts from a tar stream produced by write_archive(). Members are
+    extracted sequentially into a staging area and their media hashed by a
+    worker pool. Every IMPORT_BATCH_SIZE posts, those without a database row
+    are moved into place and their rows inserted; if the insert fails the
+    moves are undone. Whether a post is skipped depends on its row, not on
+    its files, so an interrupted import can be re-run.
+
+    Returns:
+    - dict: counts of posts read, rows inserted and posts refused
+    """
+    staging_root = os.path.join(storage.uploads_dir(), ".import")
+    os.makedirs(staging_root, exist_ok=True)
+    pending_rows = []
+    inserted = 0
+    refused = 0
+    read = 0
+
+    def flush(futures):
+        nonlocal inserted, refused
+        prepared = [(record, staging_dir, future.result()) for record, staging_dir, future in futures]
+        existing = call_db(existing_post_ids_mysql, post_type, [record["id"] for record, _, _ in prepared])
+        taken_thumbnails = call_db(
+            existing_thumbnail_ids_mysql,
+            {record["thumbnail"] for record, _, thumbnail_file in prepared if thumbnail_file and record.get("thumbnail")}
+        )
+        published = []
+        try:
+            for record, staging_dir, thumbnail_file in prepared:
+                if record["id"] in existing:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    continue
+                try:
+                    published.append((record, _publish_post(post_type, staging_dir, record, thumbnail_file, taken_thumbnails)))
+                except FileExistsError as e:
+                    refused += 1
+                    logger.error("Not importing %s/%s: %s", post_type, record["id"], e)
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+            inserted += call_db(bulk_insert_posts_mysql, post_type, [record for record, _ in published])
+        except BaseException:
+            for _, files in published:
+                _unpublish_post(files)
+            raise
+
+        for record, (_, _, thumbnail_relpath) in published:
+            if thumbnail_index is not None and thumbnail_relpath:
+                thumbnail_index.set(record["thumbnail"], thumbnail_relpath)
+            search.index_post(post_type, record["id"], record["title"], record["description"], record["author"])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        current_id, current_record, current_dir = None, None, None
+
+        def submit_current():
+            if current_record is not None:
+                pending_rows.append(
+                    (current_record, current_dir, pool.submit(_prepare_post, post_type, current_dir))
+                )
+
+        with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            for member in tar:
+                post_id, _, name = member.name.partition("/")
+                # Member names become paths on disk, so only accept plain IDs
+                if not member.isfile() or not posttypes.valid_id(post_id) or not name or "/" in name or name.startswith("."):
+                    continue
+                if post_id != current_id:
+                    submit_current()
+                    if len(pending_rows) >= IMPORT_BATCH_SIZE:
+                        flush(pending_rows)
+                        pending_rows.clear()
+                    current_id, current_record = post_id, None
+                    current_dir = os.path.join(staging_root, post_id)
+                    shutil.rmtree(current_dir, ignore_errors=True)
+                    os.makedirs(current_dir)
+                    read += 1
+
+                source = tar.extractfile(member)
+                with open(os.path.join(current_dir, name), "wb") as f:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+                if name == "row.json":
+                    with open(os.path.join(current_dir, name)) as f:
+                        current_record = json.load(f)
+                    if current_record.get("id") != post_id or (
+                        current_record.get("thumbnail") and not posttypes.valid_id(current_record["thumbnail"])
+                    ):
+                        raise ValueError(f"Archive entry {post_id} has an invalid row.json")
+            submit_current()
+        flush(pending_rows)
+
+    return {"posts_read": read, "rows_inserted": inserted, "posts_refused": refused}
+
+
+def new_import_queue():
+    """
+    Returns:
+    - queue.Queue: feed it with offer(); False means the import already ended
+    """
+    return _ChunkQueue()
+
+
+def import_stream(post_type, chunks, thumbnail_index=None):
+    """
+    Run read_archive() over chunks pushed into a queue from new_import_queue()
+    (None ends the stream). On the way out the queue is stopped and drained,
+    so a producer blocked on a full queue is released even if the import fails.
+    """
+    try:
+        return read_archive(_QueueReader(chunks), post_type, thumbnail_index)
+    finally:
+        chunks.stopped.set()
+        while True:
+            try:
+                chunks.get_nowait()
+            except queue.Empty:
+                break
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import a post type as a tar archive")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("post_type")
+    parser.add_argument("path")
+    parser.add_argument("--cursor", default=None)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        with open(args.path, "wb") as f:
+            print(f"Exported {write_archive(f, args.post_type, args.cursor)} posts")
+    else:
+        with open(args.path, "rb") as f:
+            print(read_archive(f, args.post_type))
+    sys.exit(0)
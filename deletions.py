@@ -0,0 +1,171 @@
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+import images
+import blobstore
+import posttypes
+from functions import run_db, pending_purges_mysql, count_pending_purges_mysql, purge_posts_mysql
+
+# Background purge of deleted posts. A delete only sets deleted_at on the
+# row, which hides the post from every read; the marked rows are this
+# queue, so nothing is lost when a worker restarts. For each batch of
+# marked posts the purger:
+#   1. claims the post folder by renaming it into uploads/.trash/ (one
+#      rename, so several workers never process the same post),
+#   2. removes the thumbnail and its renditions and releases the blobs the
+#      post referenced,
+#   3. deletes the trashed folder, then the rows of the whole batch.
+# File removal runs on its own small thread pool and batches are spaced by
+# DELETE_BATCH_PAUSE, so reclaiming a large video never competes with
+# request traffic for more than DELETE_IO_WORKERS threads. Posts whose
+# removal fails are retried with exponential backoff. Callers can check
+# overloaded() and refuse new deletes while the backlog is too long.
+
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "50"))
+DELETE_INTERVAL = float(os.getenv("DELETE_INTERVAL", "30"))
+DELETE_BATCH_PAUSE = float(os.getenv("DELETE_BATCH_PAUSE", "0.5"))
+DELETE_IO_WORKERS = int(os.getenv("DELETE_IO_WORKERS", "2"))
+DELETE_RETRY_BASE = float(os.getenv("DELETE_RETRY_BASE", "30"))
+DELETE_RETRY_MAX = float(os.getenv("DELETE_RETRY_MAX", "3600"))
+DELETE_BACKLOG_LIMIT = int(os.getenv("DELETE_BACKLOG_LIMIT", "10000"))
+TRASH_DIRNAME = ".trash"
+
+logger = logging.getLogger(__name__)
+
+
+def trash_root():
+    return os.path.join(storage.uploads_dir(), TRASH_DIRNAME)
+
+
+def remove_post_files(post_type, post_id, thumbnail_id, thumbnail_index):
+    """
+    Remove a post's folder, its thumbnail and renditions, and release the
+    blobs they referenced. Safe to repeat after a crash. Blocking; run it in
+    a thread.
+    """
+    post_dir = storage.post_dir(post_type, post_id)
+    trashed = os.path.join(trash_root(), f"{post_type}.{post_id}.{uuid.uuid4().hex}")
+    os.makedirs(trash_root(), exist_ok=True)
+    try:
+        os.rename(post_dir, trashed)
+    except FileNotFoundError:
+        # Already claimed by another worker, or removed before a crash
+        trashed = None
+
+    if thumbnail_id:
+        images.remove_renditions(images.thumbnail_renditions_dir(thumbnail_index.directory, thumbnail_id))
+        file_path = thumbnail_index.path(thumbnail_id)
+        thumbnail_index.remove(thumbnail_id)
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+            logger.info("Deleted thumbnail file %s", file_path)
+
+    if trashed:
+        media_refs = blobstore.read_refs(trashed)
+        shutil.rmtree(trashed)
+        for digest in set(media_refs.values()):
+            blobstore.release(digest)
+        logger.info("Deleted folder %s", post_dir)
+
+
+class DeletionQueue:
+    """
+    Parameters:
+    - thumbnail_index: ThumbnailIndex - kept current as thumbnails are removed
+    """
+
+    def __init__(self, thumbnail_index):
+        self.thumbnail_index = thumbnail_index
+        self.backlog = 0
+        self.purged = 0
+        self.failures = 0
+        self._wakeup = asyncio.Event()
+        self._retry = {}
+        self._io = ThreadPoolExecutor(max_workers=DELETE_IO_WORKERS, thread_name_prefix="purge")
+
+    def wake(self, count=1):
+        """Start purging now instead of at the next interval; count posts were just marked deleted."""
+        self.backlog += count
+        self._wakeup.set()
+
+    def overloaded(self):
+        return self.backlog >= DELETE_BACKLOG_LIMIT
+
+    def _due(self, post_type, post_id, now):
+        retry = self._retry.get((post_type, post_id))
+        return retry is None or retry[1] <= now
+
+    def _failed(self, post_type, post_id, error):
+        self.failures += 1
+        attempts = self._retry.get((post_type, post_id), (0, 0))[0] + 1
+        delay = min(DELETE_RETRY_BASE * 2 ** (attempts - 1), DELETE_RETRY_MAX)
+        self._retry[(post_type, post_id)] = (attempts, time.monotonic() + delay)
+        logger.error("Purging %s/%s failed (attempt %d, retrying in %ds): %s", post_type, post_id, attempts, delay, error)
+
+    async def purge_batch(self, post_type):
+        """
+        Returns:
+        - int: rows purged from post_type
+        """
+        # Over-fetch by the posts still backing off so they cannot starve the rest
+        pending = await run_db(pending_purges_mysql, post_type, DELETE_BATCH_SIZE + len(self._retry))
+        now = time.monotonic()
+        batch = [(post_id, thumbnail_id) for post_id, thumbnail_id in pending if self._due(post_type, post_id, now)]
+        batch = batch[:DELETE_BATCH_SIZE]
+        if not batch:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._io, remove_post_files, post_type, post_id, thumbnail_id, self.thumbnail_index)
+            for post_id, thumbnail_id in batch
+        ), return_exceptions=True)
+
+        done = []
+        for (post_id, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                self._failed(post_type, post_id, result)
+            else:
+                self._retry.pop((post_type, post_id), None)
+                done.append(post_id)
+        if not done:
+            return 0
+        purged = await run_db(purge_posts_mysql, post_type, done)
+        self.purged += purged
+        return purged
+
+    async def drain(self):
+        """Purge batches until no post is due."""
+        while True:
+            purged = 0
+            for post_type in posttypes.names():
+                purged += await self.purge_batch(post_type)
+            self.backlog = await run_db(count_pending_purges_mysql)
+            if not purged:
+                return
+            await asyncio.sleep(DELETE_BATCH_PAUSE)
+
+    async def run(self, interval=DELETE_INTERVAL):
+        """Background task: purge whenever woken, and every `interval` seconds."""
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.error("Purging deleted posts failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def shutdown(self):
+        self._io.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {"backlog": self.backlog, "purged": self.purged, "failures": self.failures, "retrying": len(self._retry)}
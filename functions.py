@@ -1,41 +1,276 @@
 import os
-import random
-import string
+import json
+import base64
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, firestore
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 from datetime import datetime
+from storage import is_shard_name, shard_parts, find_thumbnail, reserve_post_id, reserve_thumbnail_id
+import metrics
+import posttypes
+
+logger = logging.getLogger(__name__)
+
+DB_CONFIG = {
+    "host": os.getenv("MYSQL_HOST", "localhost"),
+    "port": int(os.getenv("MYSQL_PORT", "3306")),
+    "user": os.getenv("MYSQL_USER", "root"),
+    "password": os.getenv("MYSQL_PASSWORD", "mysql"),
+    "database": os.getenv("MYSQL_DATABASE", "fibohack"),
+}
+
+# "mysql" (default) or "sqlite" for the local stand-in in localdb.py
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+
+# mysql-connector refuses pools larger than 32 connections
+DB_POOL_SIZE = max(1, min(int(os.getenv("DB_POOL_SIZE", "10")), 32))
+DB_PING_ATTEMPTS = int(os.getenv("DB_PING_ATTEMPTS", "2"))
+# Streamed listings hold their own connection for as long as the client
+# reads, so they get a separate, smaller allowance instead of pool slots
+DB_STREAM_CONNECTIONS = int(os.getenv("DB_STREAM_CONNECTIONS", "4"))
+DB_STREAM_WAIT = float(os.getenv("DB_STREAM_WAIT", "5"))
+DB_STREAM_FETCH_SIZE = int(os.getenv("DB_STREAM_FETCH_SIZE", "200"))
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+# One worker per pooled connection, so callers queue here instead of
+# exhausting the pool (mysql-connector raises rather than waits).
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+_stream_slots = threading.BoundedSemaphore(DB_STREAM_CONNECTIONS)
+
+
+def get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = pooling.MySQLConnectionPool(
+                    pool_name="fibohack",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+    return _db_pool
+
 
 def get_db_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="mysql",
-        database="fibohack"
-    )
+    """
+    Borrow a connection from the shared pool. Calling close() on it hands it
+    back to the pool instead of tearing down the socket.
+
+    The connection is pinged before it is returned so a connection dropped by
+    the server (wait_timeout, restart) is transparently re-established.
+    """
+    if DB_BACKEND == "sqlite":
+        import localdb
+        return localdb.get_connection()
+    connection = get_db_pool().get_connection()
+    try:
+        connection.ping(reconnect=True, attempts=DB_PING_ATTEMPTS, delay=0)
+    except Error:
+        connection.close()
+        raise
+    return connection
+
+
+def get_streaming_connection():
+    """
+    A connection of its own, outside the pool, for unbuffered reads. close() really closes it.
+    """
+    if DB_BACKEND == "sqlite":
+        import localdb
+        return localdb.connect()
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking data-access helper on the bounded DB executor so async
+    handlers never block the event loop on a query.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, _timed_call, func, args, kwargs, time.perf_counter())
+
+
+def call_db(func, *args, **kwargs):
+    """
+    Blocking counterpart of run_db() for code already running on a worker
+    thread (exports, imports, reconcile): the call still queues on the
+    bounded DB executor instead of taking a pool connection of its own.
+    Never call it from a DB executor thread; it would wait on itself.
+    """
+    return _db_executor.submit(_timed_call, func, args, kwargs, time.perf_counter()).result()
+
+
+def _timed_call(func, args, kwargs, queued_at):
+    started = time.perf_counter()
+    metrics.DB_QUEUE_SECONDS.observe(started - queued_at)
+    metrics.DB_CALLS_IN_PROGRESS.inc()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        metrics.DB_ERRORS.inc(1, func.__name__)
+        raise
+    finally:
+        metrics.DB_CALLS_IN_PROGRESS.dec()
+        metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, func.__name__)
+
+
+def check_db_health():
+    """
+    Returns:
+    - dict: pool size and whether a round trip to the server succeeded
+    """
+    status = {"pool_size": DB_POOL_SIZE, "ok": False}
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        status["ok"] = True
+    except Error as err:
+        status["error"] = str(err)
+    finally:
+        if connection:
+            connection.close()
+    return status
+
+
+def shutdown_db():
+    _db_executor.shutdown(wait=True)
 
 
 def generate_unique_filename(path):
-    def generate_random_name():
-        return ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-    random_name = generate_random_name()
-    existing_basenames = {os.path.splitext(f)[0] for f in os.listdir(path)}
-    while random_name in existing_basenames:
-        random_name = generate_random_name()
-    return random_name
+    """
+    Kept for callers outside the app. The ID is reserved for every worker until
+    storage.release_id("thumbnails", id) is called, or until reconcile.py expires it.
+    """
+    return reserve_thumbnail_id()
 
 
 def generate_unique_folder(path):
-    def generate_random_name():
-        return ''.join(random.choices(string.ascii_letters + string.digits, k=15))
-    random_name = generate_random_name()
-    unique_folder = os.path.join(path, random_name)
-    while os.path.exists(unique_folder):
-        random_name = generate_random_name()
-        unique_folder = os.path.join(path, random_name)
-    
-    return random_name
+    """
+    Kept for callers outside the app; prefer storage.StagedPost. The ID is reserved for
+    every worker until storage.release_id(post_type, id) is called, or until reconcile.py
+    expires it.
+    """
+    return reserve_post_id(os.path.basename(os.path.normpath(path)))
+
+
+class ThumbnailIndex:
+    """
+    In-process map of thumbnail id -> file path (with extension) relative to
+    the thumbnails directory, e.g. "ab/cd/<id>.jpg" for sharded thumbnails or
+    "<id>.jpg" for ones not re-sharded yet. The directory is walked once, on
+    first use; after that the upload, update and delete handlers keep it
+    current so listings never touch the directory.
+
+    With several workers, attach_bus() shares set/remove with the others. A
+    lookup that misses still checks the thumbnail's shard folder, so an
+    upload is found even if its message was lost.
+    """
+
+    CHANNEL = "thumbnails"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = None
+        self._lock = threading.Lock()
+        self._bus = None
+
+    def attach_bus(self, bus):
+        self._bus = bus
+        bus.subscribe(self.CHANNEL, self._apply)
+
+    def _apply(self, message):
+        if message.get("relpath"):
+            self._store(message["id"], message["relpath"])
+        else:
+            self._discard(message["id"])
+
+    def _publish(self, thumbnail_id, relpath):
+        if self._bus is not None:
+            try:
+                self._bus.publish(self.CHANNEL, {"id": thumbnail_id, "relpath": relpath})
+            except Exception as e:
+                logger.warning("Could not share thumbnail index change: %s", e)
+
+    def _scan(self):
+        files = {}
+        if not os.path.isdir(self.directory):
+            return files
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                files[os.path.splitext(entry.name)[0]] = entry.name
+            elif entry.is_dir() and is_shard_name(entry.name):
+                for shard in os.scandir(entry.path):
+                    if not shard.is_dir():
+                        continue
+                    for file in os.scandir(shard.path):
+                        if file.is_file() and not file.name.endswith(".part"):
+                            files[os.path.splitext(file.name)[0]] = os.path.join(entry.name, shard.name, file.name)
+        return files
+
+    def _ensure_loaded(self):
+        if self._files is None:
+            with self._lock:
+                if self._files is None:
+                    self._files = self._scan()
+        return self._files
+
+    def get(self, thumbnail_id):
+        relpath = self._ensure_loaded().get(thumbnail_id)
+        if relpath is None and thumbnail_id:
+            # Uploaded by another worker
+            relpath = find_thumbnail(thumbnail_id, self.directory)
+            if relpath is not None:
+                self._store(thumbnail_id, relpath)
+        return relpath
+
+    def __len__(self):
+        # Does not trigger the initial scan
+        return len(self._files) if self._files is not None else 0
+
+    def path(self, thumbnail_id):
+        relpath = self.get(thumbnail_id)
+        if not relpath:
+            return None
+        path = os.path.join(self.directory, relpath)
+        if not os.path.exists(path):
+            # Moved into its shard by reshard.py while this process was running
+            sharded = os.path.join(self.directory, *shard_parts(thumbnail_id), os.path.basename(relpath))
+            if os.path.exists(sharded):
+                self._store(thumbnail_id, os.path.relpath(sharded, self.directory))
+                return sharded
+        return path
+
+    def _store(self, thumbnail_id, relpath):
+        files = self._ensure_loaded()
+        with self._lock:
+            files[thumbnail_id] = relpath
+
+    def _discard(self, thumbnail_id):
+        files = self._ensure_loaded()
+        with self._lock:
+            return files.pop(thumbnail_id, None)
+
+    def set(self, thumbnail_id, relpath):
+        self._store(thumbnail_id, relpath)
+        self._publish(thumbnail_id, relpath)
+
+    def remove(self, thumbnail_id):
+        relpath = self._discard(thumbnail_id)
+        self._publish(thumbnail_id, None)
+        return relpath
 
 
 def create_folder(path: str, folder_name: str) -> str:
@@ -50,10 +285,9 @@ def create_folder(path: str, folder_name: str) -> str:
     - str: The full path of the created folder or a message if it already exists.
     """
     folder_path = os.path.join(path, folder_name)
-    print(f"Base path: {path}")
-    print(f"Full folder path: {folder_path}")
+    logger.debug("Creating folder %s", folder_path)
     if not os.path.exists(path):
-        print("Base path does not exist. Creating base path...")
+        logger.info("Base path %s does not exist, creating it", path)
         os.makedirs(path)
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
@@ -62,44 +296,38 @@ def create_folder(path: str, folder_name: str) -> str:
         return f"Folder already exists: {folder_path}"
 
 
-def add_new_post_mysql(id, description, title, thumbnail, author,post_type):
-    if post_type in ["articles","guides","tutorials"]:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        try:
-            upload_date = datetime.now().strftime('%Y-%m-%d')
-
-            query = f"""
-            INSERT INTO {post_type} (id, description, title, thumbnail, author, upload_date)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(query, (id, description, title, thumbnail, author, upload_date))
-            connection.commit()
-            print(f"Tutorial '{title}' added successfully.")
-        except mysql.connector.Error as err:
-            print(f"Error: {err}")
-        finally:
-            cursor.close()
-            connection.close()
-    
-    else:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        try:
-            upload_date = datetime.now().strftime('%Y-%m-%d')
-
-            query = f"""
-            INSERT INTO {post_type} (id, description, title, thumbnail, author, upload_date)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(query, (id, description, title, thumbnail, author, upload_date))
-            connection.commit()
-            print(f"Tutorial '{title}' added successfully.")
-        except mysql.connector.Error as err:
-            print(f"Error: {err}")
-        finally:
-            cursor.close()
-            connection.close()
+def add_new_post_mysql(id, description, title, thumbnail, author, post_type, before_commit=None):
+    """
+    Insert a new post row.
+
+    Parameters:
+    - id, description, title, thumbnail, author: column values
+    - post_type: str (articles, guides, tutorials, etc.)
+    - before_commit: callable (optional) - run after the INSERT succeeds but
+      before COMMIT, e.g. to move the post's files into place. If it raises,
+      the insert is rolled back, so a row is never committed without its files.
+
+    Raises:
+    - mysql.connector.Error: if the insert or commit fails (after rolling back)
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        upload_date = datetime.now().strftime('%Y-%m-%d')
+        query = posttypes.get(post_type).sql["insert"]
+        cursor.execute(query, (id, description, title, thumbnail, author, upload_date))
+        if before_commit is not None:
+            before_commit()
+        connection.commit()
+        logger.info("Post %s added to %s", id, post_type)
+    except BaseException as err:
+        connection.rollback()
+        logger.error("Error adding post %s to %s: %s", id, post_type, err)
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
 
 def update_post_mysql(post_type, post_id, key=None, value=None):
     """
@@ -113,7 +341,16 @@ def update_post_mysql(post_type, post_id, key=None, value=None):
     
     Returns:
     - bool: True if successful, False otherwise
+
+    Raises:
+    - ValueError: If post_type or key is not allowed
     """
+    registered = posttypes.get(post_type)
+    if key is None or value is None:
+        query = registered.sql["touch"]
+    else:
+        query = registered.update_statement(key)
+
     connection = get_db_connection()
     cursor = connection.cursor()
     
@@ -121,70 +358,237 @@ def update_post_mysql(post_type, post_id, key=None, value=None):
         current_date = datetime.now().strftime('%Y-%m-%d')
         
         if key is None or value is None:
-            query = f"""
-            UPDATE {post_type}
-            SET changes_date = %s
-            WHERE id = %s
-            """
             values = (current_date, post_id)
         else:
-            query = f"""
-            UPDATE {post_type}
-            SET {key} = %s, changes_date = %s
-            WHERE id = %s
-            """
             values = (value, current_date, post_id)
         
         cursor.execute(query, values)
         connection.commit()
         
         if cursor.rowcount > 0:
-            print(f"Post with ID '{post_id}' updated successfully in {post_type}.")
+            logger.info("Post %s updated in %s", post_id, post_type)
             return True
         else:
-            print(f"No post found with ID '{post_id}' in {post_type}.")
+            logger.warning("No post found with ID %s in %s", post_id, post_type)
             return False
             
     except mysql.connector.Error as err:
-        print(f"Error updating post: {err}")
+        logger.error("Error updating post %s: %s", post_id, err)
         return False
     finally:
         cursor.close()
         connection.close()
 
 
-def delete_post_mysql(post_type, id,thumbnail_id):
+BATCH_UPDATABLE_FIELDS = posttypes.TEXT_FIELDS
+BATCH_CHUNK_SIZE = 1000
+
+
+def _existing_ids(cursor, post_type, post_ids, columns="id", live_only=False):
+    registered = posttypes.get(post_type)
+    rows = []
+    for i in range(0, len(post_ids), BATCH_CHUNK_SIZE):
+        chunk = post_ids[i:i + BATCH_CHUNK_SIZE]
+        cursor.execute(registered.select_in(columns, "id", len(chunk), live_only), tuple(chunk))
+        rows += cursor.fetchall()
+    return rows
+
+
+def existing_post_ids_mysql(post_type, post_ids):
     """
-    Delete a post from the database.
+    Returns:
+    - set: the subset of post_ids that have a row in post_type
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        return {row[0] for row in _existing_ids(cursor, post_type, list(post_ids))}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def existing_thumbnail_ids_mysql(thumbnail_ids, post_types=None):
+    """
+    Returns:
+    - set: the subset of thumbnail_ids referenced by a post of any type
+    """
+    thumbnail_ids = list(thumbnail_ids)
+    found = set()
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        for post_type in post_types or posttypes.names():
+            registered = posttypes.get(post_type)
+            for i in range(0, len(thumbnail_ids), BATCH_CHUNK_SIZE):
+                chunk = thumbnail_ids[i:i + BATCH_CHUNK_SIZE]
+                cursor.execute(registered.select_in("thumbnail", "thumbnail", len(chunk)), tuple(chunk))
+                found.update(row[0] for row in cursor.fetchall())
+        return found
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def batch_update_posts_mysql(post_type, updates):
+    """
+    Apply many field updates in one transaction, one executemany per field.
     
     Parameters:
     - post_type: str (articles, guides, tutorials, etc.)
-    - id: str (the unique identifier of the post)
+    - updates: list of (post_id, field, value) tuples; field must be in BATCH_UPDATABLE_FIELDS
     
     Returns:
-    - bool: True if successful, False otherwise
+    - dict: post_id -> "updated" or "not_found"
+    
+    Raises:
+    - ValueError: If a field is not updatable
+    - mysql.connector.Error: If the transaction fails; nothing is applied
     """
+    registered = posttypes.get(post_type)
+    for _, field, _ in updates:
+        if field not in BATCH_UPDATABLE_FIELDS:
+            raise ValueError(f"Field '{field}' cannot be batch updated")
+
     connection = get_db_connection()
     cursor = connection.cursor()
     try:
-        query = f"""
-        DELETE FROM {post_type}
-        WHERE id = %s and thumbnail = %s
-        """
-        
-        cursor.execute(query, (id,thumbnail_id,))
+        post_ids = list({post_id for post_id, _, _ in updates})
+        existing = {row[0] for row in _existing_ids(cursor, post_type, post_ids, live_only=True)}
+        current_date = datetime.now().strftime('%Y-%m-%d')
+
+        by_field = {}
+        for post_id, field, value in updates:
+            if post_id in existing:
+                by_field.setdefault(field, []).append((value, current_date, post_id))
+        for field, rows in by_field.items():
+            cursor.executemany(registered.update_statement(field), rows)
         connection.commit()
-        
-        if cursor.rowcount > 0:
-            print(f"Post with ID '{id}' deleted successfully from {post_type}.")
-            return True
-        else:
-            print(f"No post found with ID '{id}' in {post_type}.")
-            return False
-            
-    except mysql.connector.Error as err:
-        print(f"Error deleting post: {err}")
-        return False
+        return {post_id: ("updated" if post_id in existing else "not_found") for post_id in post_ids}
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def batch_delete_posts_mysql(post_type, post_ids):
+    """
+    Mark many posts deleted in one transaction. Their files and rows are
+    removed later by deletions.py.
+    
+    Parameters:
+    - post_type: str (articles, guides, tutorials, etc.)
+    - post_ids: list of str
+    
+    Returns:
+    - dict: post_id -> thumbnail id for every live post that was marked deleted
+    
+    Raises:
+    - mysql.connector.Error: If the transaction fails; nothing is deleted
+    """
+    registered = posttypes.get(post_type)
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        rows = _existing_ids(cursor, post_type, list(set(post_ids)), columns="id, thumbnail", live_only=True)
+        deleted = {post_id: thumbnail for post_id, thumbnail in rows}
+        deleted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # mysql-connector runs executemany() for UPDATE statement by statement, so
+        # chunked IN lists save most of the round trips
+        ids = list(deleted)
+        for i in range(0, len(ids), BATCH_CHUNK_SIZE):
+            chunk = ids[i:i + BATCH_CHUNK_SIZE]
+            cursor.execute(registered.soft_delete_in(len(chunk)), (deleted_at, *chunk))
+        connection.commit()
+        return deleted
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def soft_delete_post_mysql(post_type, post_id):
+    """
+    Mark a post deleted. It disappears from every read at once; deletions.py
+    removes its files and then the row.
+
+    Returns:
+    - bool: True if a live post was marked, False if there was none
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        deleted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(posttypes.get(post_type).sql["soft_delete"], (deleted_at, post_id))
+        connection.commit()
+        return cursor.rowcount > 0
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def pending_purges_mysql(post_type, limit):
+    """
+    Returns:
+    - list: (post_id, thumbnail id) of up to `limit` deleted posts, oldest deletion first
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(posttypes.get(post_type).sql["pending_purge"], (limit,))
+        return [tuple(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def count_pending_purges_mysql(post_types=None):
+    """
+    Returns:
+    - int: deleted posts whose files and rows have not been purged yet
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        total = 0
+        for post_type in post_types or posttypes.names():
+            cursor.execute(posttypes.get(post_type).sql["count_pending_purge"])
+            total += cursor.fetchone()[0]
+        return total
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def purge_posts_mysql(post_type, post_ids):
+    """
+    Remove the rows of deleted posts whose files are gone.
+
+    Returns:
+    - int: number of rows removed
+    """
+    registered = posttypes.get(post_type)
+    post_ids = list(post_ids)
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        removed = 0
+        for i in range(0, len(post_ids), BATCH_CHUNK_SIZE):
+            chunk = post_ids[i:i + BATCH_CHUNK_SIZE]
+            cursor.execute(registered.purge_in(len(chunk)), tuple(chunk))
+            removed += cursor.rowcount
+        connection.commit()
+        return removed
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
     finally:
         cursor.close()
         connection.close()
@@ -208,19 +612,12 @@ def get_thumbnail(post_id: str, post_type: str):
         
     connection = get_db_connection()
     if not connection:
-        print("Failed to establish database connection")
+        logger.error("Failed to establish database connection")
         return None
         
     cursor = connection.cursor(dictionary=True)
     try:
-        allowed_post_types = ['articles', 'guides', 'tutorials'] 
-        if post_type not in allowed_post_types:
-            raise ValueError(f"Invalid post_type. Must be one of {allowed_post_types}")
-            
-        query = f"""
-        SELECT thumbnail FROM {post_type}
-        WHERE id = %s
-        """
+        query = posttypes.get(post_type).sql["thumbnail"]
         cursor.execute(query, (post_id,))
         result = cursor.fetchone()
         
@@ -230,19 +627,48 @@ def get_thumbnail(post_id: str, post_type: str):
         return result['thumbnail']
         
     except Error as err:
-        print(f"Database error: {err}")
+        logger.error("Database error: %s", err)
         return None
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.exception("Unexpected error: %s", e)
         return None
     finally:
         cursor.close()
         connection.close()
 
+LISTING_COLUMNS = posttypes.LISTING_COLUMNS
+LISTING_ORDER = posttypes.LISTING_ORDER
+
+
+def encode_cursor(created_at, post_id):
+    """
+    Build the opaque cursor pointing just after the row (created_at, post_id).
+    """
+    payload = json.dumps([str(created_at), post_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+    - tuple: (created_at, post_id) encoded in the cursor
+
+    Raises:
+    - ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, post_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, post_id
+
+
 def get_post_mysql(post_type, offset_upper=50, offset_lower=0):
     """
-    Fetch posts from the database. If no offsets are provided, it will return data from index 50 to 0.
-    If offsets are given, it will return data based on those limits.
+    Fetch posts from the database by offset, newest first. If no offsets are provided,
+    it will return data from index 50 to 0. Prefer get_post_page_mysql, whose cost does
+    not grow with the page number.
 
     Parameters:
     - post_type: str (e.g., 'articles', 'guides', 'tutorials')
@@ -250,16 +676,18 @@ def get_post_mysql(post_type, offset_upper=50, offset_lower=0):
     - offset_lower: int (optional) - the lower bound for the data range
 
     Returns:
-    - list: A list of tuples representing the rows fetched from the database
+    - list: A list of dicts with the listing columns
+
+    Raises:
+    - mysql.connector.Error: If the query fails; an empty list would be cached as a real page
     """
+    query = posttypes.get(post_type).sql["offset_page"]
     connection = get_db_connection()
-    cursor = connection.cursor()
+    cursor = connection.cursor(dictionary=True)
 
     if offset_upper is None and offset_lower is None:
         offset_upper = 50
         offset_lower = 0
-
-    query = f"SELECT * FROM {post_type} LIMIT %s OFFSET %s"
     
     limit = offset_upper - offset_lower
     offset = offset_lower
@@ -270,9 +698,193 @@ def get_post_mysql(post_type, offset_upper=50, offset_lower=0):
         return result
 
     except mysql.connector.Error as err:
-        print(f"Error fetching posts: {err}")
-        return []
+        logger.error("Error fetching posts: %s", err)
+        raise
     
     finally:
         cursor.close()
         connection.close()
+
+
+def get_post_page_mysql(post_type, limit=20, cursor=None):
+    """
+    Fetch one page of posts with keyset pagination over (upload_date, id), newest first.
+    Every page is an index range scan, so page N costs the same as page 1.
+
+    Parameters:
+    - post_type: str (e.g., 'articles', 'guides', 'tutorials')
+    - limit: int - page size
+    - cursor: str (optional) - next_cursor from the previous page
+
+    Returns:
+    - tuple: (list of dicts with the listing columns, next cursor or None)
+
+    Raises:
+    - ValueError: If the cursor is malformed
+    - mysql.connector.Error: If the query fails; an empty page would be cached as a real one
+    """
+    statements = posttypes.get(post_type).sql
+    # Fetch one extra row to know whether another page exists
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        query = statements["page_after"]
+        values = (created_at, created_at, post_id, limit + 1)
+    else:
+        query = statements["page"]
+        values = (limit + 1,)
+
+    connection = get_db_connection()
+    db_cursor = connection.cursor(dictionary=True)
+
+    try:
+        db_cursor.execute(query, values)
+        rows = db_cursor.fetchall()
+    except mysql.connector.Error as err:
+        logger.error("Error fetching posts: %s", err)
+        raise
+    finally:
+        db_cursor.close()
+        connection.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
+
+class PostStream:
+    """
+    Listing rows read in batches of fetch_size through a prepared, unbuffered
+    cursor, so memory stays flat however large the range and the first rows
+    are available before the rest are read. Uses one of
+    DB_STREAM_CONNECTIONS dedicated connections until close().
+
+    Parameters:
+    - post_type: str (e.g., 'articles', 'guides', 'tutorials')
+    - offset_lower, offset_upper: int (optional) - the row window, newest first
+    - limit: int - number of rows when no window is given
+    - cursor: str (optional) - start after this keyset cursor instead of at the newest post
+
+    Raises:
+    - ValueError: If post_type or the cursor is invalid
+    - TimeoutError: If no streaming connection frees up within DB_STREAM_WAIT seconds
+    - mysql.connector.Error: If the query fails
+    """
+
+    def __init__(self, post_type, offset_lower=None, offset_upper=None, limit=20, cursor=None,
+                 fetch_size=DB_STREAM_FETCH_SIZE):
+        statements = posttypes.get(post_type).sql
+        if offset_lower is not None and offset_upper is not None:
+            query = statements["offset_page"]
+            values = (max(0, offset_upper - offset_lower), offset_lower)
+        elif cursor:
+            created_at, post_id = decode_cursor(cursor)
+            query = statements["page_after"]
+            values = (created_at, created_at, post_id, limit)
+        else:
+            query = statements["page"]
+            values = (limit,)
+
+        if not _stream_slots.acquire(timeout=DB_STREAM_WAIT):
+            raise TimeoutError("Too many listings are being streamed, try again later")
+        self.fetch_size = fetch_size
+        self._connection = None
+        self._cursor = None
+        try:
+            self._connection = get_streaming_connection()
+            self._cursor = self._connection.cursor(prepared=True)
+            self._cursor.execute(query, values)
+            self._columns = self._cursor.column_names
+        except BaseException:
+            self.close()
+            raise
+
+    def batches(self):
+        """Yields lists of up to fetch_size row dicts; closes the stream when exhausted."""
+        try:
+            while True:
+                rows = self._cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                yield [dict(zip(self._columns, row)) for row in rows]
+        finally:
+            self.close()
+
+    def close(self):
+        """Idempotent. Also runs when the client goes away mid-stream, with rows still unread."""
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        try:
+            try:
+                if self._cursor is not None:
+                    self._cursor.close()
+            except Error as err:
+                # "Unread result found": the connection is dropped below, and the rows with it
+                logger.info("Listing stream closed before its last row: %s", err)
+            try:
+                connection.close()
+            except Error as err:
+                logger.warning("Error closing listing stream connection, dropping it: %s", err)
+                connection.shutdown()
+        finally:
+            _stream_slots.release()
+
+
+def get_post_by_id_mysql(post_type, post_id):
+    """
+    Fetch a single post's listing columns.
+
+    Parameters:
+    - post_type: str (e.g., 'articles', 'guides', 'tutorials')
+    - post_id: str (the unique identifier of the post)
+
+    Returns:
+    - Optional[dict]: the row, or None if not found or an error occurs
+    """
+    query = posttypes.get(post_type).sql["by_id"]
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query, (post_id,))
+        return cursor.fetchone()
+    except mysql.connector.Error as err:
+        logger.error("Error fetching post: %s", err)
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def bulk_insert_posts_mysql(post_type, rows):
+    """
+    Insert many posts in one transaction; rows whose id already exists are skipped,
+    so an interrupted import can simply be re-run.
+    
+    Parameters:
+    - post_type: str (articles, guides, tutorials, etc.)
+    - rows: list of dicts with id, description, title, thumbnail, author, upload_date, changes_date
+    
+    Returns:
+    - int: number of rows inserted
+    """
+    if not rows:
+        return 0
+    query = posttypes.get(post_type).sql["bulk_insert"]
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(query, [
+            (row["id"], row["description"], row["title"], row["thumbnail"], row["author"],
+             row["upload_date"], row.get("changes_date"))
+            for row in rows
+        ])
+        connection.commit()
+        return cursor.rowcount
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,24 @@
+import os
+
+from serve import HOST, PORT, default_workers, configure_workers
+
+# gunicorn settings for the app:
+#   gunicorn -c gunicorn.conf.py main:app
+# Every setting can be overridden with the usual environment variables.
+
+bind = os.getenv("BIND", f"{HOST}:{PORT}")
+workers = default_workers()
+worker_class = "uvicorn.workers.UvicornWorker"
+backlog = 2048
+keepalive = 5
+# Uploads of large videos can take a while
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))
+graceful_timeout = 30
+# Recycle workers now and then so slow leaks do not accumulate
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+# Each worker imports main itself, after the fork, so none of them share
+# pools, sockets or the pub/sub connection with the master
+preload_app = False
+
+configure_workers(workers)
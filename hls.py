@@ -0,0 +1,177 @@
+import os
+import json
+import uuid
+import shutil
+import asyncio
+import logging
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# HLS renditions of tutorial videos, built in the background by a local
+# ffmpeg. Output goes to <post folder>/hls/:
+#   master.m3u8            variant playlist listing every rendition
+#   <name>/index.m3u8      media playlist of one rendition
+#   <name>/seg_00000.ts    6 second segments
+# The job is skipped entirely when ffmpeg is not installed or HLS_ENABLED=0.
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+HLS_ENABLED = os.getenv("HLS_ENABLED", "1") == "1"
+HLS_WORKERS = int(os.getenv("HLS_WORKERS", "1"))
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+HLS_DIRNAME = "hls"
+MASTER_PLAYLIST = "master.m3u8"
+
+# name, height, video bitrate, audio bitrate
+HLS_RENDITIONS = [
+    ("360p", 360, "800k", "96k"),
+    ("720p", 720, "2800k", "128k"),
+    ("1080p", 1080, "5000k", "192k"),
+]
+
+_hls_pool = None
+
+
+def get_hls_pool():
+    global _hls_pool
+    if _hls_pool is None:
+        _hls_pool = ProcessPoolExecutor(max_workers=HLS_WORKERS)
+    return _hls_pool
+
+
+def shutdown_hls_pool():
+    if _hls_pool is not None:
+        _hls_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def available():
+    return HLS_ENABLED and shutil.which(FFMPEG_BIN) is not None
+
+
+def hls_dir(post_folder):
+    return os.path.join(post_folder, HLS_DIRNAME)
+
+
+def find_video_file(post_folder):
+    try:
+        return next((f for f in sorted(os.listdir(post_folder)) if f.startswith("video.")), None)
+    except FileNotFoundError:
+        return None
+
+
+def remove_hls(post_folder):
+    """Drop renditions of a video that has been replaced."""
+    shutil.rmtree(hls_dir(post_folder), ignore_errors=True)
+
+
+def _probe_height(video_path):
+    """Height of the first video stream, or None if ffprobe is unavailable or fails."""
+    if shutil.which(FFPROBE_BIN) is None:
+        return None
+    try:
+        output = subprocess.run(
+            [FFPROBE_BIN, "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=height",
+             "-of", "json", video_path],
+            capture_output=True, check=True, timeout=60,
+        ).stdout
+        return int(json.loads(output)["streams"][0]["height"])
+    except (subprocess.SubprocessError, OSError, ValueError, KeyError, IndexError):
+        return None
+
+
+def _renditions_for(source_height):
+    """Never upscale: keep renditions up to the source height, and always the smallest."""
+    if source_height is None:
+        return HLS_RENDITIONS
+    chosen = [rendition for rendition in HLS_RENDITIONS if rendition[1] <= source_height]
+    return chosen or HLS_RENDITIONS[:1]
+
+
+def _bandwidth(video_bitrate, audio_bitrate):
+    def bits(rate):
+        return int(rate[:-1]) * 1000 if rate.endswith("k") else int(rate)
+    return bits(video_bitrate) + bits(audio_bitrate)
+
+
+def generate_hls(video_path, out_dir):
+    """
+    Runs in a worker process. Encodes each rendition with ffmpeg into a
+    staging directory, writes the master playlist, then swaps the directory
+    into place so players never see a partial set.
+
+    Returns:
+    - list: names of the renditions written
+    """
+    source = os.stat(video_path)
+    renditions = _renditions_for(_probe_height(video_path))
+    staging_dir = f"{out_dir}.{uuid.uuid4().hex}.part"
+    os.makedirs(staging_dir)
+    try:
+        master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for name, height, video_bitrate, audio_bitrate in renditions:
+            rendition_dir = os.path.join(staging_dir, name)
+            os.makedirs(rendition_dir)
+            subprocess.run(
+                [
+                    FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                    "-i", video_path,
+                    "-map", "0:v:0", "-map", "0:a:0?",
+                    "-vf", f"scale=-2:{height}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+                    "-b:v", video_bitrate, "-maxrate", video_bitrate, "-bufsize", video_bitrate,
+                    # Keyframe at every segment boundary so each segment starts cleanly
+                    "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+                    "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "2",
+                    "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+                    "-hls_segment_filename", os.path.join(rendition_dir, "seg_%05d.ts"),
+                    os.path.join(rendition_dir, "index.m3u8"),
+                ],
+                check=True, capture_output=True,
+            )
+            master.append(f"#EXT-X-STREAM-INF:BANDWIDTH={_bandwidth(video_bitrate, audio_bitrate)},NAME=\"{name}\"")
+            master.append(f"{name}/index.m3u8")
+        with open(os.path.join(staging_dir, MASTER_PLAYLIST), "w") as f:
+            f.write("\n".join(master) + "\n")
+
+        # The video was replaced while encoding; its own job will publish instead
+        try:
+            current = os.stat(video_path)
+        except FileNotFoundError:
+            current = None
+        if current is None or (current.st_ino, current.st_mtime_ns) != (source.st_ino, source.st_mtime_ns):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return []
+
+        old_dir = None
+        if os.path.isdir(out_dir):
+            old_dir = f"{out_dir}.{uuid.uuid4().hex}.old"
+            os.rename(out_dir, old_dir)
+        os.rename(staging_dir, out_dir)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return [rendition[0] for rendition in renditions]
+
+
+async def process_video(post_folder):
+    """Background task: segment the post's video into HLS renditions off the request path."""
+    if not available():
+        return
+    video_file = find_video_file(post_folder)
+    if video_file is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        written = await loop.run_in_executor(
+            get_hls_pool(), generate_hls, os.path.join(post_folder, video_file), hls_dir(post_folder)
+        )
+        if written:
+            logger.info("HLS renditions %s written for %s", ", ".join(written), post_folder)
+    except subprocess.CalledProcessError as e:
+        logger.error("ffmpeg failed for %s: %s", post_folder, e.stderr.decode("utf-8", "replace")[-2000:])
+    except Exception as e:
+        logger.error("Error generating HLS for %s: %s", post_folder, e)
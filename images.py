@@ -0,0 +1,195 @@
+import os
+import logging
+import uuid
+import shutil
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from storage import shard_parts
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+RENDITION_WIDTHS = [int(width) for width in os.getenv("RENDITION_WIDTHS", "160,320,640").split(",")]
+RENDITION_QUALITY = int(os.getenv("RENDITION_QUALITY", "80"))
+
+# Preference order when the client accepts several
+FORMATS = [
+    ("avif", "image/avif", "AVIF"),
+    ("webp", "image/webp", "WEBP"),
+    ("jpg", "image/jpeg", "JPEG"),
+]
+
+_image_pool = None
+
+
+def get_image_pool():
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _image_pool
+
+
+def shutdown_image_pool():
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def thumbnail_renditions_dir(thumbnails_dir, thumbnail_id):
+    return os.path.join(thumbnails_dir, "renditions", *shard_parts(thumbnail_id), thumbnail_id)
+
+
+def banner_renditions_dir(post_folder):
+    return os.path.join(post_folder, "renditions")
+
+
+def _supported_formats():
+    supported = []
+    for extension, _, pil_format in FORMATS:
+        if pil_format != "JPEG":
+            try:
+                if not features.check(pil_format.lower()):
+                    continue
+            except ValueError:
+                # Pillow too old to know the format
+                continue
+        supported.append((extension, pil_format))
+    return supported
+
+
+def generate_renditions(source_path, out_dir):
+    """
+    Runs in a worker process. Writes <width>.<ext> for every configured width
+    and supported format into out_dir, replacing any previous set. Images are
+    never upscaled, and EXIF/ICC metadata is dropped (orientation is applied
+    to the pixels first).
+
+    Returns:
+    - list: the file names written
+    """
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    widths = sorted({min(width, image.width) for width in RENDITION_WIDTHS})
+    staging_dir = f"{out_dir}.{uuid.uuid4().hex}.part"
+    os.makedirs(staging_dir)
+    written = []
+    try:
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for extension, pil_format in _supported_formats():
+                frame = resized.convert("RGB") if pil_format == "JPEG" else resized
+                filename = f"{width}.{extension}"
+                frame.save(os.path.join(staging_dir, filename), pil_format, quality=RENDITION_QUALITY)
+                written.append(filename)
+
+        # Swap the whole directory so readers never see a half-written set
+        old_dir = None
+        if os.path.isdir(out_dir):
+            old_dir = f"{out_dir}.{uuid.uuid4().hex}.old"
+            os.rename(out_dir, old_dir)
+        os.rename(staging_dir, out_dir)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return written
+
+
+async def process_image(source_path, out_dir):
+    """Background task: build renditions off the request path."""
+    if Image is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_image_pool(), generate_renditions, source_path, out_dir)
+    except Exception as e:
+        logger.error("Error generating renditions for %s: %s", source_path, e)
+
+
+def remove_renditions(out_dir):
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def accepted_media_types(accept_header):
+    """
+    Returns:
+    - dict: media type -> q value, for every type listed in Accept
+    """
+    accepted = {}
+    for part in (accept_header or "").split(","):
+        media_type, *params = part.split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.strip().lower()
+        if media_type:
+            accepted[media_type] = max(q, accepted.get(media_type, 0.0))
+    return accepted
+
+
+def choose_rendition(out_dir, accept_header, size):
+    """
+    Pick the smallest rendition at least `size` px wide (or the largest one
+    available) in the format the client prefers. AVIF and WebP are only sent
+    when listed explicitly; JPEG also matches image/* and */*, and is the
+    fallback when it is not mentioned at all. The highest q value wins, ties
+    go by FORMATS order, and q=0 excludes a format.
+
+    Returns:
+    - tuple: (path, media type) or (None, None) if there are no renditions
+    """
+    try:
+        files = os.listdir(out_dir)
+    except FileNotFoundError:
+        return None, None
+
+    accepted = accepted_media_types(accept_header)
+    candidates = []
+    for order, (extension, media_type, _) in enumerate(FORMATS):
+        q = accepted.get(media_type)
+        if q is None and media_type == "image/jpeg":
+            # Unlisted JPEG stays the last resort unless a wildcard says otherwise
+            q = accepted.get("image/*", accepted.get("*/*", 0.001))
+        if not q or q <= 0:
+            continue
+        widths = sorted(
+            int(name.split(".")[0]) for name in files
+            if name.endswith(f".{extension}") and name.split(".")[0].isdigit()
+        )
+        if widths:
+            candidates.append((-q, order, extension, media_type, widths))
+    if not candidates:
+        return None, None
+
+    _, _, extension, media_type, widths = min(candidates)
+    width = next((w for w in widths if w >= size), widths[-1])
+    return os.path.join(out_dir, f"{width}.{extension}"), media_type
+
+    # Only explicitly listed formats; image/* and */* still get JPEG
+    accepted = accepted_media_types(accept_header)
+    for extension, media_type, _ in FORMATS:
+        if media_type != "image/jpeg" and media_type not in accepted:
+            continue
+        widths = sorted(
+            int(name.split(".")[0]) for name in files
+            if name.endswith(f".{extension}") and name.split(".")[0].isdigit()
+        )
+        if not widths:
+            continue
+        width = next((w for w in widths if w >= size), widths[-1])
+        return os.path.join(out_dir, f"{width}.{extension}"), media_type
+    return None, None
@@ -0,0 +1,162 @@
+import os
+import re
+import sqlite3
+import threading
+
+from mysql.connector import Error
+
+import posttypes
+
+# SQLite stand-in for the MySQL pool, selected with DB_BACKEND=sqlite. It
+# lets the app (and benchmark.py) run without a MySQL server: the helpers
+# in functions.py keep their MySQL SQL, and the few dialect differences
+# they use (%s placeholders, INSERT IGNORE, dictionary cursors) are
+# translated here. Not meant for production data.
+
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(os.getcwd(), "uploads", ".posts.db"))
+POST_TYPES = posttypes.names()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id VARCHAR(32) NOT NULL PRIMARY KEY,
+    description TEXT,
+    title VARCHAR(255) NOT NULL,
+    thumbnail VARCHAR(32),
+    author VARCHAR(255),
+    upload_date DATE NOT NULL,
+    changes_date DATE,
+    deleted_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_{table}_listing ON {table} (upload_date, id);
+"""
+
+# Columns added by later migrations, for databases created before them
+ADDED_COLUMNS = {"deleted_at": "DATETIME"}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+_INSERT_IGNORE_RE = re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE)
+
+
+def translate(query):
+    return _INSERT_IGNORE_RE.sub("INSERT OR IGNORE", query).replace("%s", "?")
+
+
+class Cursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _run(self, method, query, params):
+        try:
+            return method(translate(query), params)
+        except sqlite3.Error as e:
+            # Surface as the mysql-connector error the helpers already catch
+            raise Error(msg=str(e)) from e
+
+    def execute(self, query, params=()):
+        self._run(self._cursor.execute, query, params)
+
+    def executemany(self, query, seq_params):
+        self._run(self._cursor.executemany, query, list(seq_params))
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {description[0]: value for description, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    @property
+    def column_names(self):
+        return tuple(description[0] for description in self._cursor.description or ())
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """One SQLite connection per thread; close() keeps it open, like returning it to a pool."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, dictionary=False, prepared=False):
+        # sqlite3 caches compiled statements itself; prepared is accepted for API parity
+        return Cursor(self._connection.cursor(), dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        pass
+
+
+def ensure_schema(connection, path):
+    if path in _schema_ready:
+        return
+    with _schema_lock:
+        if path not in _schema_ready:
+            for table in POST_TYPES:
+                connection.executescript(SCHEMA.format(table=table))
+                existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+                for column, column_type in ADDED_COLUMNS.items():
+                    if column not in existing:
+                        connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_deleted ON {table} (deleted_at)")
+            connection.commit()
+            _schema_ready.add(path)
+
+
+class DedicatedConnection(Connection):
+    """Not shared with other threads' work; close() closes it."""
+
+    def close(self):
+        self._connection.close()
+
+    def shutdown(self):
+        self._connection.close()
+
+
+def _open(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    raw = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    raw.execute("PRAGMA journal_mode=WAL")
+    raw.execute("PRAGMA synchronous=NORMAL")
+    ensure_schema(raw, path)
+    return raw
+
+
+def connect(path=None):
+    """A new connection for long reads, like a streamed listing."""
+    return DedicatedConnection(_open(path or SQLITE_DB_PATH))
+
+
+def get_connection(path=None):
+    path = path or SQLITE_DB_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(path)
+    if connection is None:
+        connection = connections[path] = Connection(_open(path))
+    return connection
@@ -1,18 +1,49 @@
-from functions import generate_unique_filename, generate_unique_folder, add_new_post_mysql,get_thumbnail, update_post_mysql,delete_post_mysql,get_post_mysql
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from functions import add_new_post_mysql,get_thumbnail, update_post_mysql,soft_delete_post_mysql,get_post_mysql, get_post_page_mysql, get_post_by_id_mysql, PostStream, batch_update_posts_mysql, batch_delete_posts_mysql, decode_cursor, run_db, check_db_health, shutdown_db, ThumbnailIndex, DB_POOL_SIZE
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Response, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import mimetypes
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from datetime import date
 import os
 import json
 import logging
 import shutil
+import asyncio
 import base64
+import hashlib
+import time
+from media import file_response
+import storage
+from storage import save_upload_file, UploadTooLarge, MAX_UPLOAD_BYTES
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+import resumable
+import render
+import images
+import blobstore
+import search
+import corpus
+import reconcile
+import hls
+import metrics
+import logs
+import pubsub
+import posttypes
+import deletions
+import snapshots
+import responses
+from compress import CompressionMiddleware
+from cache import ResponseCache, create_backend
+from resumable import ResumableUploadError
 
 
-logging.basicConfig(level=logging.INFO)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+DEFAULT_THUMBNAIL_SIZE = 320
+
+logs.configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
@@ -23,64 +54,193 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link"],
 )
+# Inside MetricsMiddleware, so response byte counts are what went on the wire
+app.add_middleware(CompressionMiddleware)
+
+
+thumbnail_index = ThumbnailIndex(os.path.abspath(os.path.join(os.getcwd(), "uploads", "thumbnails")))
+listing_cache = ResponseCache(create_backend())
+slow_request_profiler = metrics.SlowRequestProfiler()
+deletion_queue = deletions.DeletionQueue(thumbnail_index)
+
+
+class MetricsMiddleware:
+    """
+    Records latency per route template and response bytes for every request,
+    and hands slow requests to the profiler when PROFILE_SLOW_REQUEST_MS is set.
+    Written as plain ASGI so streamed bodies are counted without buffering.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        sent = 0
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        profiler = slow_request_profiler.start()
+        metrics.HTTP_REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.HTTP_REQUESTS_IN_PROGRESS.dec()
+            # Label by template (/posts/{post_type}/{post_id}), never the raw path
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.HTTP_REQUEST_SECONDS.observe(elapsed, scope["method"], route, status)
+            metrics.HTTP_RESPONSE_BYTES.inc(sent, route)
+            if profiler is not None:
+                path = slow_request_profiler.stop(profiler, scope["method"], route, elapsed)
+                if path:
+                    logger.warning(
+                        "Slow request %s %s took %.0f ms, profile written to %s",
+                        scope["method"], scope["path"], elapsed * 1000, path,
+                        extra={"route": route, "duration_ms": round(elapsed * 1000, 1), "profile": path},
+                    )
+
+
+class UploadLimitMiddleware:
+    """
+    Answers 413 before the body is read when Content-Length already exceeds
+    what the upload route accepts. The per-field limits in save_upload_file
+    only apply once Starlette has spooled the whole multipart body to disk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        limit = storage.request_body_limit(scope["path"])
+        content_length = Headers(scope=scope).get("content-length")
+        if limit is not None and content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(
+                status_code=413, content={"detail": f"Request body exceeds the {limit} byte limit"},
+                headers={"Connection": "close"},
+            )
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+# Inside MetricsMiddleware, so rejected uploads are still counted
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+def collect_app_metrics():
+    for key, value in listing_cache.stats().items():
+        if isinstance(value, (int, float)):
+            yield "listing_cache_" + key, "Listing cache counters (see /cache/stats)", {}, value
+    yield "db_pool_size", "Configured MySQL connection pool size", {}, DB_POOL_SIZE
+    yield "thumbnail_index_entries", "Thumbnails known to the in-memory index", {}, len(thumbnail_index)
+    yield "log_records_dropped", "Log records dropped because the log queue was full", {}, logs.dropped_records()
+    for key, value in listing_snapshots.stats().items():
+        yield "listing_snapshot_" + key, "Listing snapshot counters", {}, value
+    for key, value in deletion_queue.stats().items():
+        yield "deletion_queue_" + key, "Deleted posts waiting for, or processed by, the purge queue", {}, value
+
+
+metrics.register_collector(collect_app_metrics)
+
+
+background_jobs = []
+# Connects this worker to the others (see pubsub.py); created at startup so
+# each forked worker gets its own
+bus = None
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    global bus
+    posttypes.create_directories()
+    bus = pubsub.create_bus()
+    listing_cache.attach_bus(bus)
+    thumbnail_index.attach_bus(bus)
+    if reconcile.RECONCILE_INTERVAL > 0:
+        background_jobs.append(asyncio.create_task(reconcile.reconcile_loop()))
+    background_jobs.append(asyncio.create_task(deletion_queue.run()))
+    listing_snapshots.start()
+
+
+@app.on_event("shutdown")
+async def close_db_executor():
+    for job in background_jobs:
+        job.cancel()
+    deletion_queue.shutdown()
+    listing_snapshots.shutdown()
+    shutdown_db()
+    render.shutdown_render_pool()
+    images.shutdown_image_pool()
+    hls.shutdown_hls_pool()
+    if bus is not None:
+        bus.close()
+    logs.shutdown_logging()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/db")
+async def db_health():
+    return await run_db(check_db_health)
+
+
+def resolve_post_type(post_type):
+    """
+    Returns:
+    - posttypes.PostType: the registered type
+
+    Raises:
+    - HTTPException: 400 if post_type is not registered
+    """
+    try:
+        return posttypes.get(post_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def require_post_id(post_id):
+    """IDs become folder names, so anything but a plain ID is simply not found."""
+    if not posttypes.valid_id(post_id):
+        raise HTTPException(status_code=404, detail="Post not found")
 
-def ensure_upload_dirs(post_type):
-    """Create necessary upload directories if they don't exist"""
-    
-    if post_type=="articles":
-        base_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
-        thumbnails_dir = os.path.join(base_dir, "thumbnails")
-        articles_dir = os.path.join(base_dir, "articles")
-        
-        os.makedirs(thumbnails_dir, exist_ok=True)
-        os.makedirs(articles_dir, exist_ok=True)
-        
-        return base_dir, thumbnails_dir, articles_dir
-    
-    elif post_type=="guides":
-        base_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
-        thumbnails_dir = os.path.join(base_dir, "thumbnails")
-        guides_dir = os.path.join(base_dir, "guides")
-        
-        os.makedirs(thumbnails_dir, exist_ok=True)
-        os.makedirs(guides_dir, exist_ok=True)
-        
-        return base_dir, thumbnails_dir, guides_dir
-    
-    elif post_type=="tutorials":
-        base_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
-        thumbnails_dir = os.path.join(base_dir, "thumbnails")
-        tutorials_dir = os.path.join(base_dir, "tutorials")
-        
-        os.makedirs(thumbnails_dir, exist_ok=True)
-        os.makedirs(tutorials_dir, exist_ok=True)
-        
-        return base_dir, thumbnails_dir, tutorials_dir
 
 @app.post("/upload-post/{post_type}")
 async def upload_post(
     post_type: str,
+    background_tasks: BackgroundTasks,
     thumbnail: UploadFile = File(...),
     markdown: UploadFile = File(...),
     text_data: str = Form(...),
     banner: UploadFile = File(None),
-    video: UploadFile = File(None)
+    video: UploadFile = File(None),
+    video_upload_id: str = Form(None)
 ):
     """
     Unified handler for uploading different types of posts (articles, guides, tutorials)
     """
-    valid_post_types = {"articles", "guides", "tutorials"}
-    if post_type not in valid_post_types:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid post type. Must be one of: {', '.join(valid_post_types)}"
-        )
+    registered = resolve_post_type(post_type)
 
+    staged = None
+    committed = False
     try:
-        base_dir, thumbnails_dir, content_dir = ensure_upload_dirs(post_type)
-        logger.info(f"Upload directories created/verified at {base_dir}")
-
         try:
             text_data_dict = json.loads(text_data)
         except json.JSONDecodeError as e:
@@ -92,77 +252,140 @@ async def upload_post(
             if field not in text_data_dict:
                 raise HTTPException(status_code=422, detail=f"Missing required field: {field}")
 
-        if post_type in ["articles", "guides"] and not banner:
-            raise HTTPException(status_code=400, detail="Banner image is required for articles and guides")
-        if post_type == "tutorials" and not video:
-            raise HTTPException(status_code=400, detail="Video file is required for tutorials")
+        provided_media = {"banner": banner, "video": video or video_upload_id}
+        for media in registered.required_media:
+            if not provided_media.get(media):
+                raise HTTPException(status_code=400, detail=f"{media.capitalize()} file is required for {post_type}")
 
-        unique_folder_name = generate_unique_folder(content_dir)
-        post_folder_path = os.path.join(content_dir, unique_folder_name)
-        os.makedirs(post_folder_path, exist_ok=True)
-        logger.info(f"Created post folder: {post_folder_path}")
+        staged = await run_in_threadpool(storage.StagedPost, post_type)
+        unique_folder_name = staged.post_id
+        logger.info(f"Staging {post_type}/{unique_folder_name} in {staged.dir}")
 
-        thumbnail_id = generate_unique_filename(thumbnails_dir)
-        thumbnail_path = os.path.join(thumbnails_dir, thumbnail_id)
-        logger.info(f"Saving thumbnail to: {thumbnail_path}")
+        thumbnail_ext = os.path.splitext(thumbnail.filename)[1]
+        thumbnail_id, staged_thumbnail_path = await run_in_threadpool(staged.stage_thumbnail, thumbnail_ext)
+        thumbnail_filename = storage.thumbnail_relpath(thumbnail_id, thumbnail_ext)
         
-        try:
-            thumbnail_content = await thumbnail.read()
-            with open(thumbnail_path+"."+thumbnail.filename.split(".")[1], "wb") as f:
-                f.write(thumbnail_content)
-            logger.info(f"Thumbnail saved successfully: {len(thumbnail_content)} bytes")
-        except Exception as e:
-            logger.error(f"Error saving thumbnail: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error saving thumbnail: {str(e)}")
-
-        media_path = None
-        if post_type in ["articles", "guides"] and banner:
+        media_filename = None
+        media_upload = None
+        media_type = None
+        if "banner" in registered.media and banner:
             banner_ext = os.path.splitext(banner.filename)[1]
             media_filename = f"banner{banner_ext}"
-            media_path = os.path.join(post_folder_path, media_filename)
-            media_content = await banner.read()
+            media_upload = banner
             media_type = "banner"
-        elif post_type == "tutorials" and video:
+        elif "video" in registered.media and video:
             video_ext = os.path.splitext(video.filename)[1]
             media_filename = f"video{video_ext}"
-            media_path = os.path.join(post_folder_path, media_filename)
-            media_content = await video.read()
+            media_upload = video
+            media_type = "video"
+        elif "video" in registered.media and video_upload_id:
             media_type = "video"
 
-        if media_path:
+        async def save_thumbnail():
+            try:
+                thumbnail_size, thumbnail_digest = await save_upload_file(
+                    thumbnail, staged_thumbnail_path, "thumbnail", heartbeat=staged.heartbeat
+                )
+                await store_media(staged.dir, "thumbnail", staged_thumbnail_path, thumbnail_digest)
+                logger.info(f"Thumbnail saved successfully: {thumbnail_size} bytes")
+            except UploadTooLarge:
+                raise
+            except Exception as e:
+                logger.error(f"Error saving thumbnail: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Error saving thumbnail: {str(e)}")
+
+        async def save_media():
+            nonlocal media_filename
+            if media_upload is None:
+                try:
+                    media_filename, staged_media_path = await run_in_threadpool(
+                        resumable.finalize_upload, video_upload_id, post_type, staged.dir
+                    )
+                except ResumableUploadError as e:
+                    raise HTTPException(status_code=e.status_code, detail=e.detail)
+                media_digest = await run_in_threadpool(blobstore.hash_file, staged_media_path)
+                await store_media(staged.dir, "video", staged_media_path, media_digest)
+                logger.info(f"Video assembled from resumable upload {video_upload_id}")
+                return
             try:
-                with open(media_path, "wb") as f:
-                    f.write(media_content)
-                logger.info(f"{media_type.capitalize()} saved successfully: {len(media_content)} bytes")
+                staged_media_path = staged.path(media_filename)
+                media_size, media_digest = await save_upload_file(
+                    media_upload, staged_media_path, media_type, heartbeat=staged.heartbeat
+                )
+                await store_media(staged.dir, media_type, staged_media_path, media_digest)
+                logger.info(f"{media_type.capitalize()} saved successfully: {media_size} bytes")
+            except UploadTooLarge:
+                raise
             except Exception as e:
                 logger.error(f"Error saving {media_type}: {str(e)}")
                 raise HTTPException(status_code=500, detail=f"Error saving {media_type}: {str(e)}")
 
-        markdown_path = os.path.join(post_folder_path, "markdown.md")
-        logger.info(f"Saving markdown to: {markdown_path}")
-        
-        try:
-            markdown_content = await markdown.read()
-            with open(markdown_path, "wb") as f:
-                f.write(markdown_content)
-            logger.info(f"Markdown saved successfully: {len(markdown_content)} bytes")
-        except Exception as e:
-            logger.error(f"Error saving markdown: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error saving markdown: {str(e)}")
+        async def save_markdown():
+            try:
+                markdown_size, markdown_digest = await save_upload_file(
+                    markdown, staged.path("markdown.md"), "markdown", heartbeat=staged.heartbeat
+                )
+                await run_in_threadpool(render.write_markdown_hash, staged.dir, markdown_digest)
+                logger.info(f"Markdown saved successfully: {markdown_size} bytes")
+            except UploadTooLarge:
+                raise
+            except Exception as e:
+                logger.error(f"Error saving markdown: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Error saving markdown: {str(e)}")
+
+        # The parts are independent, so write them concurrently: latency is
+        # the slowest part rather than the sum. Every write runs on the
+        # threadpool, so the loop stays free. Wait for all of them even if one
+        # fails, so nothing is still writing into the folder when it is rolled back.
+        parts = [save_thumbnail(), save_markdown()]
+        if media_type:
+            parts.append(save_media())
+        results = await asyncio.gather(*parts, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
         try:
-            add_new_post_mysql(
+            # The files are renamed into place inside the insert's transaction:
+            # if either step fails the row is rolled back and the files removed
+            await run_db(
+                add_new_post_mysql,
                 title=text_data_dict["title"],
                 thumbnail=thumbnail_id,
                 description=text_data_dict["description"],
                 author=text_data_dict["author"],
                 id=unique_folder_name,
-                post_type=post_type
+                post_type=post_type,
+                before_commit=staged.publish
             )
-            logger.info(f"{post_type.capitalize()} added to database successfully")
+            committed = True
         except Exception as e:
             logger.error(f"Error adding {post_type} to database: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        logger.info(f"{post_type.capitalize()} added to database successfully")
+        if video_upload_id and media_upload is None:
+            # Kept until now so a failed insert can be retried with the same upload
+            await run_in_threadpool(resumable.complete_upload, video_upload_id)
+
+        post_folder_path = staged.target
+        thumbnail_path = staged.thumbnail_final_path
+        markdown_path = os.path.join(post_folder_path, "markdown.md")
+        media_path = os.path.join(post_folder_path, media_filename) if media_filename else None
+
+        thumbnail_index.set(thumbnail_id, thumbnail_filename)
+        await listing_cache.invalidate(post_type)
+        background_tasks.add_task(render.prerender_markdown, post_folder_path)
+        background_tasks.add_task(
+            search.index_post, post_type, unique_folder_name,
+            text_data_dict["title"], text_data_dict["description"], text_data_dict["author"]
+        )
+        background_tasks.add_task(
+            images.process_image, thumbnail_path, images.thumbnail_renditions_dir(thumbnail_index.directory, thumbnail_id)
+        )
+        if media_type == "banner":
+            background_tasks.add_task(images.process_image, media_path, images.banner_renditions_dir(post_folder_path))
+        elif media_type == "video":
+            background_tasks.add_task(hls.process_video, post_folder_path)
 
         response = {
             "message": f"{post_type.capitalize()} uploaded successfully",
@@ -178,14 +401,22 @@ async def upload_post(
 
         return response
 
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    finally:
+        if staged is not None and not committed:
+            await run_in_threadpool(staged.rollback)
     
     
 @app.post("/update-post/{post_type}/{field}/{post_id}")
 async def update_post(
     post_type: str,
+    background_tasks: BackgroundTasks,
     field: str,
     post_id: str,
     value: Optional[str] = None,
@@ -194,24 +425,28 @@ async def update_post(
     video: Optional[UploadFile] = File(None),
     markdown: Optional[UploadFile] = File(None)
 ):
-    print(f"Post type received: {post_type}")
+    registered = resolve_post_type(post_type)
+    require_post_id(post_id)
+    logger.info(f"Updating {field} of {post_type}/{post_id}")
     
-    if field not in ["banner", "thumbnails", "video", "markdown"]:
+    if field in posttypes.TEXT_FIELDS:
         if value is None:
             raise HTTPException(status_code=400, detail="Value is required for non-file fields")
-        update_post_mysql(post_id=post_id, post_type=post_type, key=field, value=value)
+        await run_db(update_post_mysql, post_id=post_id, post_type=post_type, key=field, value=value)
+        await listing_cache.invalidate(post_type)
+        background_tasks.add_task(search.update_post_fields, post_type, post_id, **{field: value})
         return {"message": f"Updated {field} successfully"}
-    
+
+    elif field not in registered.file_fields:
+        raise HTTPException(status_code=400, detail=f"Field '{field}' cannot be updated for {post_type}")
+
     elif banner or thumbnail or markdown or video :
-        base_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
-        
         if field == "thumbnails" and thumbnail:
-            thumbnail_filename = get_thumbnail(post_id=post_id, post_type=post_type)
+            thumbnail_filename = await run_db(get_thumbnail, post_id=post_id, post_type=post_type)
             if not thumbnail_filename:
                 raise HTTPException(status_code=404, detail="Existing thumbnail not found in database")
             
-            thumbnails_dir = os.path.join(base_dir, "thumbnails")
-            os.makedirs(thumbnails_dir, exist_ok=True)
+            thumbnails_dir = thumbnail_index.directory
 
             new_ext = os.path.splitext(thumbnail.filename)[1]
             if not new_ext:
@@ -219,27 +454,36 @@ async def update_post(
                 ext = mimetypes.guess_extension(content_type)
                 new_ext = ext if ext else '.unknown'
             
-            new_filename = f"{thumbnail_filename}{new_ext}"
-            new_file_path = os.path.join(thumbnails_dir, new_filename)
+            new_filename = storage.thumbnail_relpath(thumbnail_filename, new_ext)
+            new_file_path = storage.thumbnail_path(thumbnail_filename, new_ext)
             
             try:
-                for file in os.listdir(thumbnails_dir):
-                    if file.startswith(f"{thumbnail_filename}."):
-                        os.remove(os.path.join(thumbnails_dir, file))
-                
-                with open(new_file_path, "wb") as buffer:
-                    shutil.copyfileobj(thumbnail.file, buffer)
+                _, thumbnail_digest = await save_upload_file(thumbnail, new_file_path, "thumbnail")
+                old_filename = thumbnail_index.get(thumbnail_filename)
+                if old_filename and old_filename != new_filename:
+                    os.remove(os.path.join(thumbnails_dir, old_filename))
+                await store_media(
+                    storage.post_dir(post_type, post_id), "thumbnail", new_file_path, thumbnail_digest
+                )
+                thumbnail_index.set(thumbnail_filename, new_filename)
+                background_tasks.add_task(
+                    images.process_image, new_file_path, images.thumbnail_renditions_dir(thumbnails_dir, thumbnail_filename)
+                )
                 
-                update_post_mysql(
+                await run_db(
+                    update_post_mysql,
                     post_id=post_id,
                     post_type=post_type,
                 )
+                await listing_cache.invalidate(post_type)
                 
                 return {
                     "message": "Thumbnail updated successfully",
-                    "filename": new_filename
+                    "filename": os.path.basename(new_filename)
                 }
                 
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
             except Exception as e:
                 raise HTTPException(
                     status_code=500,
@@ -247,7 +491,7 @@ async def update_post(
                 )
                 
         elif field == "banner" and banner:
-            banner_dir = os.path.join(base_dir, post_type, post_id)
+            banner_dir = storage.post_dir(post_type, post_id)
             os.makedirs(banner_dir, exist_ok=True)
             
             try:
@@ -257,26 +501,30 @@ async def update_post(
                     ext = mimetypes.guess_extension(content_type)
                     new_ext = ext if ext else '.unknown'
                 
-                for file in os.listdir(banner_dir):
-                    if file.startswith("banner."):
-                        os.remove(os.path.join(banner_dir, file))
-                
                 new_filename = f"banner{new_ext}"
                 new_file_path = os.path.join(banner_dir, new_filename)
                 
-                with open(new_file_path, "wb") as buffer:
-                    shutil.copyfileobj(banner.file, buffer)
+                _, banner_digest = await save_upload_file(banner, new_file_path, "banner")
+                for file in os.listdir(banner_dir):
+                    if file.startswith("banner.") and file != new_filename:
+                        os.remove(os.path.join(banner_dir, file))
+                await store_media(banner_dir, "banner", new_file_path, banner_digest)
+                background_tasks.add_task(images.process_image, new_file_path, images.banner_renditions_dir(banner_dir))
                 
-                update_post_mysql(
+                await run_db(
+                    update_post_mysql,
                     post_id=post_id,
                     post_type=post_type,
                 )
+                await listing_cache.invalidate(post_type)
                 
                 return {
                     "message": "Banner updated successfully",
                     "filename": new_filename
                 }
                 
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
             except Exception as e:
                 raise HTTPException(
                     status_code=500,
@@ -284,7 +532,7 @@ async def update_post(
                 )
                 
         elif field == "video" and video:
-            video_dir = os.path.join(base_dir, post_type, post_id)
+            video_dir = storage.post_dir(post_type, post_id)
             os.makedirs(video_dir, exist_ok=True)
             
             try:
@@ -294,26 +542,31 @@ async def update_post(
                     ext = mimetypes.guess_extension(content_type)
                     new_ext = ext if ext else '.unknown'
                 
-                for file in os.listdir(video_dir):
-                    if file.startswith("video."):
-                        os.remove(os.path.join(video_dir, file))
-                
                 new_filename = f"video{new_ext}"
                 new_file_path = os.path.join(video_dir, new_filename)
                 
-                with open(new_file_path, "wb") as buffer:
-                    shutil.copyfileobj(video.file, buffer)
+                _, video_digest = await save_upload_file(video, new_file_path, "video")
+                for file in os.listdir(video_dir):
+                    if file.startswith("video.") and file != new_filename:
+                        os.remove(os.path.join(video_dir, file))
+                await store_media(video_dir, "video", new_file_path, video_digest)
+                await run_in_threadpool(hls.remove_hls, video_dir)
+                background_tasks.add_task(hls.process_video, video_dir)
                 
-                update_post_mysql(
+                await run_db(
+                    update_post_mysql,
                     post_id=post_id,
                     post_type=post_type,
                 )
+                await listing_cache.invalidate(post_type)
                 
                 return {
                     "message": "Video updated successfully",
                     "filename": new_filename
                 }
                 
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
             except Exception as e:
                 raise HTTPException(
                     status_code=500,
@@ -321,7 +574,7 @@ async def update_post(
                 )
                 
         elif field == "markdown" and markdown:
-            markdown_dir = os.path.join(base_dir, post_type, post_id)
+            markdown_dir = storage.post_dir(post_type, post_id)
             os.makedirs(markdown_dir, exist_ok=True)
             
             try:
@@ -331,26 +584,28 @@ async def update_post(
                     ext = mimetypes.guess_extension(content_type)
                     new_ext = ext if ext else '.md'
                 
-                for file in os.listdir(markdown_dir):
-                    if file.startswith("markdown."):
-                        os.remove(os.path.join(markdown_dir, file))
-
                 new_filename = f"markdown{new_ext}"
                 new_file_path = os.path.join(markdown_dir, new_filename)
                 
-                with open(new_file_path, "wb") as buffer:
-                    shutil.copyfileobj(markdown.file, buffer)
+                _, markdown_digest = await save_upload_file(markdown, new_file_path, "markdown")
+                await run_in_threadpool(render.replace_markdown, markdown_dir, new_filename, markdown_digest)
+                background_tasks.add_task(render.prerender_markdown, markdown_dir)
+                background_tasks.add_task(search.update_post_body, post_type, post_id)
                     
-                update_post_mysql(
+                await run_db(
+                    update_post_mysql,
                     post_id=post_id,
                     post_type=post_type,
                 )
+                await listing_cache.invalidate(post_type)
                 
                 return {
                     "message": "Markdown updated successfully",
                     "filename": new_filename
                 }
                 
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
             except Exception as e:
                 raise HTTPException(
                     status_code=500,
@@ -363,93 +618,633 @@ async def update_post(
         raise HTTPException(status_code=400, detail=f"No {field} file provided")
 
 
+@app.post("/resumable-uploads/{post_type}")
+async def initiate_resumable_upload(
+    post_type: str,
+    filename: str = Form(...),
+    total_size: int = Form(...),
+    chunk_size: Optional[int] = Form(None),
+    post_id: Optional[str] = Form(None)
+):
+    """
+    Start a resumable video upload. Chunks are then PUT to
+    /resumable-uploads/{upload_id}/chunks/{index} in any order (and in
+    parallel), and the upload is finalized either into an existing post via
+    /resumable-uploads/{upload_id}/finalize or into a new tutorial by passing
+    video_upload_id to /upload-post/tutorials.
+    """
+    if "video" not in resolve_post_type(post_type).media:
+        raise HTTPException(status_code=400, detail=f"Resumable uploads are not supported for {post_type}")
+    if post_id is not None:
+        require_post_id(post_id)
+    try:
+        return await run_in_threadpool(
+            resumable.initiate_upload,
+            post_type, filename, total_size, chunk_size, post_id, MAX_UPLOAD_BYTES["video"]
+        )
+    except ResumableUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@app.put("/resumable-uploads/{upload_id}/chunks/{index}")
+async def put_resumable_chunk(request: Request, upload_id: str, index: int):
+    try:
+        manifest, fd, offset, length = await run_in_threadpool(resumable.open_chunk_writer, upload_id, index)
+    except ResumableUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    received = 0
+    try:
+        async for data in request.stream():
+            if not data:
+                continue
+            if received + len(data) > length:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} must be exactly {length} bytes")
+            await run_in_threadpool(resumable.write_at, fd, data, offset + received)
+            received += len(data)
+        if received != length:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be exactly {length} bytes, got {received}")
+    except BaseException:
+        os.close(fd)
+        raise
+
+    await run_in_threadpool(resumable.commit_chunk, upload_id, fd, index)
+    return {"upload_id": upload_id, "index": index, "bytes": received}
+
+
+@app.get("/resumable-uploads/{upload_id}")
+async def get_resumable_upload(upload_id: str):
+    try:
+        return await run_in_threadpool(resumable.upload_status, upload_id)
+    except ResumableUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@app.post("/resumable-uploads/{upload_id}/finalize")
+async def finalize_resumable_upload(upload_id: str, background_tasks: BackgroundTasks, post_id: Optional[str] = None):
+    """
+    Move a complete upload into an existing tutorial as its video
+    """
+    try:
+        manifest = await run_in_threadpool(resumable.load_manifest, upload_id)
+        post_id = post_id or manifest["post_id"]
+        if not post_id:
+            raise HTTPException(status_code=400, detail="post_id is required")
+        require_post_id(post_id)
+        post_type = manifest["post_type"]
+        post_folder_path = storage.post_dir(post_type, post_id)
+        new_filename, new_path = await run_in_threadpool(
+            resumable.finalize_upload, upload_id, post_type, post_folder_path
+        )
+    except ResumableUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    digest = await run_in_threadpool(blobstore.hash_file, new_path)
+    await store_media(post_folder_path, "video", new_path, digest)
+    await run_in_threadpool(hls.remove_hls, post_folder_path)
+    background_tasks.add_task(hls.process_video, post_folder_path)
+    await run_db(update_post_mysql, post_id=post_id, post_type=post_type)
+    await run_in_threadpool(resumable.complete_upload, upload_id)
+    await listing_cache.invalidate(post_type)
+    return {
+        "message": "Video updated successfully",
+        "filename": new_filename
+    }
+
+
+@app.delete("/resumable-uploads/{upload_id}")
+async def abort_resumable_upload(upload_id: str):
+    try:
+        await run_in_threadpool(resumable.abort_upload, upload_id)
+    except ResumableUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"status": "Success", "message": "Upload aborted"}
+
+
 @app.delete("/delete-post/{post_type}/{post_id}")
 async def delete_post(
     post_id: str,
     post_type: str
 ):
+    """
+    Hide the post at once; its files and row are removed by the background
+    deletion queue (see deletions.py).
+    """
     if not post_id:
         return {"error": "Post ID is required"}
     if not post_type:
         return {"error": "Post type is required"}
+    resolve_post_type(post_type)
+    require_post_id(post_id)
+    if deletion_queue.overloaded():
+        raise HTTPException(
+            status_code=503, detail="Too many deletions pending, try again later", headers={"Retry-After": "30"}
+        )
     
     try:
-        base_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
-        main_dir = os.path.join(base_dir, post_type)
-        thumbnail_id = get_thumbnail(post_id=post_id, post_type=post_type)
-        if thumbnail_id:
-            thumbnail_dir = os.path.join(base_dir, "thumbnails")
-            for file in os.listdir(thumbnail_dir):
-                if os.path.splitext(file)[0] == thumbnail_id:
-                    file_path = os.path.join(thumbnail_dir, file)
-                    os.remove(file_path)
-                    print(f"Deleted thumbnail file: {file_path}")
-                    break
-        post_dir = os.path.join(main_dir, post_id)
-        if os.path.exists(post_dir) and os.path.isdir(post_dir):
-            shutil.rmtree(post_dir)
-            print(f"Deleted folder: {post_dir}")
-        
-        delete_post_mysql(post_id=post_id,thumbnail_id=thumbnail_id,post_type=post_type)
-        
-        return {"status": "Success", "message": "Post and related resources deleted"}
-    
+        deleted = await run_db(soft_delete_post_mysql, post_type=post_type, post_id=post_id)
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Error deleting {post_type}/{post_id}: {str(e)}")
         return {"status": "Error", "message": str(e)}
-    
+    if not deleted:
+        return {"status": "Error", "message": "Post not found"}
 
-@app.get("/get-posts/{post_type}")
-async def get_posts(post_type: str, offset_upper: int, offset_lower: int):
-    def remove_key_from_dict_list(dict_list, key_to_remove):
-        return [{key: value for key, value in d.items() if key != key_to_remove} for d in dict_list]
-    
-    data = get_post_mysql(post_type=post_type, offset_lower=offset_lower, offset_upper=offset_upper)
+    await listing_cache.invalidate(post_type)
+    await run_in_threadpool(search.remove_post, post_type, post_id)
+    deletion_queue.wake()
+    return {"status": "Success", "message": "Post deleted"}
     
-    base_dir = os.path.abspath(os.path.join(os.getcwd(), "uploads"))
-    thumbnail_dir = os.path.join(base_dir, "thumbnails")
-    
-    column_names = ['id', 'description', 'title', 'thumbnail', 'author', 'created_at', 'updated_at']
-    
-    structured_data = []
-    for row in data:
-        post_dict = {column_names[i]: row[i] for i in range(len(column_names))}
-        
-        post_dict['thumbnail_file'] = None
-        if post_dict['thumbnail']:
-            thumbnail_prefix = post_dict['thumbnail']
-            thumbnail_files = os.listdir(thumbnail_dir)
-            matching_file = next(
-                (f for f in thumbnail_files if f.startswith(thumbnail_prefix)),
-                None
+
+class BatchUpdateItem(BaseModel):
+    post_id: str
+    field: str
+    value: str
+
+
+class BatchUpdateRequest(BaseModel):
+    updates: List[BatchUpdateItem]
+
+
+class BatchDeleteRequest(BaseModel):
+    post_ids: List[str]
+
+
+@app.post("/batch/update-posts/{post_type}")
+async def batch_update_posts(post_type: str, body: BatchUpdateRequest, background_tasks: BackgroundTasks):
+    """
+    Update title/description/author of many posts in a single transaction.
+    Returns a per-post result; if the transaction fails nothing is applied.
+    """
+    resolve_post_type(post_type)
+    if len(body.updates) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+    updates = [(item.post_id, item.field, item.value) for item in body.updates]
+    try:
+        results = await run_db(batch_update_posts_mysql, post_type, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch update failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    await listing_cache.invalidate(post_type)
+    background_tasks.add_task(
+        search.update_posts_fields, post_type, [u for u in updates if results.get(u[0]) == "updated"]
+    )
+    return {
+        "updated": sum(1 for status in results.values() if status == "updated"),
+        "results": [{"post_id": post_id, "status": status} for post_id, status in results.items()]
+    }
+
+
+@app.post("/batch/delete-posts/{post_type}")
+async def batch_delete_posts(post_type: str, body: BatchDeleteRequest):
+    """
+    Delete many posts: they are marked deleted in one transaction and their
+    files are removed by the background deletion queue. Returns a per-post result.
+    """
+    resolve_post_type(post_type)
+    if len(body.post_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    if deletion_queue.overloaded():
+        raise HTTPException(
+            status_code=503, detail="Too many deletions pending, try again later", headers={"Retry-After": "30"}
+        )
+
+    try:
+        deleted = await run_db(batch_delete_posts_mysql, post_type, body.post_ids)
+    except Exception as e:
+        logger.error(f"Batch delete failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    await listing_cache.invalidate(post_type)
+    await run_in_threadpool(search.remove_posts, post_type, list(deleted))
+    deletion_queue.wake(len(deleted))
+
+    results = [{"post_id": post_id, "status": "deleted"} for post_id in deleted]
+
+    results += [
+        {"post_id": post_id, "status": "not_found"}
+        for post_id in dict.fromkeys(body.post_ids) if post_id not in deleted
+    ]
+    return {"deleted": len(deleted), "results": results}
+
+
+@app.get("/export/{post_type}")
+async def export_posts(post_type: str, cursor: Optional[str] = None):
+    """
+    Stream every post of a type as a tar archive (rows, markdown and media),
+    newest first. Each row.json carries a cursor; pass the last one received
+    to resume an interrupted export.
+    """
+    resolve_post_type(post_type)
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        corpus.stream_archive(post_type, cursor, thumbnail_index),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{post_type}.tar"'},
+    )
+
+
+@app.post("/import/{post_type}")
+async def import_posts(request: Request, post_type: str):
+    """
+    Restore posts from a tar archive produced by /export, streamed as the
+    request body. Posts that already exist are skipped.
+    """
+    resolve_post_type(post_type)
+
+    chunks = corpus.new_import_queue()
+    importer = asyncio.ensure_future(run_in_threadpool(corpus.import_stream, post_type, chunks, thumbnail_index))
+    try:
+        async for data in request.stream():
+            if data and not await run_in_threadpool(chunks.offer, data):
+                break
+    finally:
+        await run_in_threadpool(chunks.offer, None)
+
+    try:
+        result = await importer
+    except Exception as e:
+        logger.error(f"Import failed: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+    finally:
+        await listing_cache.invalidate(post_type)
+    return result
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return listing_cache.stats()
+
+
+async def store_media(post_folder, field, path, digest):
+    """
+    Back a freshly saved thumbnail/banner/video by the content-addressed blob
+    store and release the blob it replaced, if nothing else uses it.
+    """
+    def _store():
+        blobstore.ingest(path, digest)
+        previous = blobstore.record_ref(post_folder, field, digest)
+        if previous and previous != digest:
+            blobstore.release(previous)
+
+    await run_in_threadpool(_store)
+
+
+def serve_image(request, original_path, renditions_dir, size):
+    """
+    Serve the best rendition for the requested width and Accept header,
+    falling back to the original while renditions are still being built.
+    """
+    if size:
+        rendition_path, media_type = images.choose_rendition(renditions_dir, request.headers.get("accept"), size)
+        if rendition_path:
+            return file_response(request, rendition_path, media_type=media_type, extra_headers={"Vary": "Accept"})
+    return file_response(request, original_path)
+
+
+@app.get("/thumbnails/{thumbnail_id}")
+async def get_thumbnail_file(request: Request, thumbnail_id: str, size: Optional[int] = Query(None, ge=1, le=4096)):
+    """
+    Serve a thumbnail by id with ETag/Last-Modified validators and Range support.
+    With ?size=N the smallest rendition at least N px wide is served instead,
+    as AVIF/WebP when the Accept header allows it.
+    """
+    file_path = thumbnail_index.path(thumbnail_id)
+    if not file_path or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return serve_image(
+        request, file_path, images.thumbnail_renditions_dir(thumbnail_index.directory, thumbnail_id), size
+    )
+
+
+@app.get("/banners/{post_type}/{post_id}")
+async def get_banner_file(
+    request: Request,
+    post_type: str,
+    post_id: str,
+    size: Optional[int] = Query(None, ge=1, le=4096)
+):
+    resolve_post_type(post_type)
+    require_post_id(post_id)
+    post_folder = storage.post_dir(post_type, post_id)
+    banner_file = None
+    if os.path.isdir(post_folder):
+        banner_file = next((f for f in os.listdir(post_folder) if f.startswith("banner.")), None)
+    if not banner_file:
+        raise HTTPException(status_code=404, detail="Banner not found")
+    return serve_image(
+        request, os.path.join(post_folder, banner_file), images.banner_renditions_dir(post_folder), size
+    )
+
+
+HLS_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+@app.api_route("/videos/{post_type}/{post_id}", methods=["GET", "HEAD"])
+async def get_video_file(request: Request, post_type: str, post_id: str):
+    """
+    Stream a tutorial's video. Range requests get 206 responses, so players
+    can seek and start playback without downloading the whole file.
+    """
+    resolve_post_type(post_type)
+    require_post_id(post_id)
+    post_folder = storage.post_dir(post_type, post_id)
+    video_file = await run_in_threadpool(hls.find_video_file, post_folder)
+    if not video_file:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return file_response(request, os.path.join(post_folder, video_file))
+
+
+@app.api_route("/videos/{post_type}/{post_id}/hls/{file_path:path}", methods=["GET", "HEAD"])
+async def get_hls_file(request: Request, post_type: str, post_id: str, file_path: str):
+    """Serve the HLS playlists and segments built by hls.process_video."""
+    resolve_post_type(post_type)
+    require_post_id(post_id)
+    root = hls.hls_dir(storage.post_dir(post_type, post_id))
+    path = os.path.normpath(os.path.join(root, file_path))
+    extension = os.path.splitext(path)[1]
+    if not path.startswith(root + os.sep) or extension not in HLS_MEDIA_TYPES or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    # Playlists are always revalidated so a replaced video is picked up at once
+    cache_control = "no-cache" if extension == ".m3u8" else None
+    return file_response(request, path, media_type=HLS_MEDIA_TYPES[extension], cache_control=cache_control)
+
+
+@app.get("/search")
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    post_type: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Ranked full-text search over title, description, author and body.
+    Words ending in * (and the last word) match as prefixes.
+    """
+    if post_type is not None:
+        resolve_post_type(post_type)
+    started = time.perf_counter()
+    results = await run_in_threadpool(search.search, q, post_type, limit, offset)
+    return {
+        "query": q,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+@app.get("/posts/{post_type}/{post_id}")
+async def get_post(request: Request, post_type: str, post_id: str):
+    """
+    Fetch one post's metadata plus its markdown rendered to HTML. The
+    rendered HTML is cached on disk and the response carries an ETag, so
+    If-None-Match revalidation returns 304 without rendering or a body.
+    """
+    registered = resolve_post_type(post_type)
+    require_post_id(post_id)
+    post = await run_db(get_post_by_id_mysql, post_type=post_type, post_id=post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    post_folder = storage.post_dir(post_type, post_id)
+    if not os.path.isdir(post_folder):
+        raise HTTPException(status_code=404, detail="Post content not found")
+
+    digest = await run_in_threadpool(render.markdown_hash, post_folder)
+    etag_source = json.dumps([digest, post["title"], post["description"], post["author"], str(post["updated_at"])])
+    etag = '"' + hashlib.sha256(etag_source.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    html, _ = await render.get_rendered_html(post_folder)
+
+    thumbnail_url = None
+    if post["thumbnail"] and thumbnail_index.get(post["thumbnail"]):
+        thumbnail_url = str(request.url_for("get_thumbnail_file", thumbnail_id=post["thumbnail"]))
+
+    body = {key: value for key, value in post.items() if key != "thumbnail"}
+    body["thumbnail_url"] = thumbnail_url
+    if "banner" in registered.media:
+        body["banner_url"] = str(request.url_for("get_banner_file", post_type=post_type, post_id=post_id))
+    if "video" in registered.media:
+        body["video_url"] = str(request.url_for("get_video_file", post_type=post_type, post_id=post_id))
+        body["hls_url"] = None
+        if await run_in_threadpool(os.path.isfile, os.path.join(hls.hls_dir(post_folder), hls.MASTER_PLAYLIST)):
+            body["hls_url"] = str(request.url_for(
+                "get_hls_file", post_type=post_type, post_id=post_id, file_path=hls.MASTER_PLAYLIST
+            ))
+    body["html"] = html
+    return responses.FastJSONResponse(content=body, headers=headers)
+
+
+class ThumbnailFile(BaseModel):
+    data: str
+    mime_type: str
+    filename: str
+
+
+class PostSummary(BaseModel):
+    """One post of a /get-posts listing; fields are in the order they are sent."""
+    id: str
+    description: Optional[str] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    created_at: date
+    updated_at: Optional[date] = None
+    thumbnail_file: Optional[ThumbnailFile] = None
+    thumbnail_url: Optional[str] = None
+
+
+def build_listing_post(row, base_url, thumbnail_size=DEFAULT_THUMBNAIL_SIZE, inline_thumbnails=False):
+    """
+    Turn a listing row into the post object /get-posts returns.
+
+    Parameters:
+    - row: dict - listing columns
+    - base_url: str or URL - the app's base URL, for the absolute thumbnail URL
+
+    Returns:
+    - dict: the row without its thumbnail id, plus thumbnail_url and thumbnail_file
+    """
+    post_dict = dict(row)
+    thumbnail_id = post_dict.pop('thumbnail')
+    post_dict['thumbnail_file'] = None
+    post_dict['thumbnail_url'] = None
+    if thumbnail_id:
+        matching_file = thumbnail_index.get(thumbnail_id)
+        if matching_file:
+            post_dict['thumbnail_url'] = str(
+                app.url_path_for("get_thumbnail_file", thumbnail_id=thumbnail_id)
+                .make_absolute_url(base_url)
+                .include_query_params(size=thumbnail_size)
             )
-            if matching_file:
-                # Read and encode the thumbnail file
-                file_path = os.path.join(thumbnail_dir, matching_file)
-                try:
-                    with open(file_path, 'rb') as file:
-                        file_content = file.read()
-                        # Convert binary data to base64 string
-                        base64_encoded = base64.b64encode(file_content).decode('utf-8')
-                        # Add file type information for proper frontend handling
-                        file_extension = os.path.splitext(matching_file)[1].lower()
-                        mime_type = {
-                            '.jpg': 'image/jpeg',
-                            '.jpeg': 'image/jpeg',
-                            '.png': 'image/png',
-                            '.gif': 'image/gif'
-                        }.get(file_extension, 'application/octet-stream')
-                        
-                        post_dict['thumbnail_file'] = {
-                            'data': base64_encoded,
-                            'mime_type': mime_type,
-                            'filename': matching_file
-                        }
-                except Exception as e:
-                    print(f"Error reading thumbnail file: {e}")
-                    post_dict['thumbnail_file'] = None
-        
-        structured_data.append(post_dict)
-    
-    structured_data = remove_key_from_dict_list(structured_data, "thumbnail")
-    return structured_data
\ No newline at end of file
+        if matching_file and inline_thumbnails:
+            # Read and encode the thumbnail file
+            file_path = thumbnail_index.path(thumbnail_id)
+            try:
+                with open(file_path, 'rb') as file:
+                    file_content = file.read()
+                    # Convert binary data to base64 string
+                    base64_encoded = base64.b64encode(file_content).decode('utf-8')
+                    # Add file type information for proper frontend handling
+                    file_extension = os.path.splitext(matching_file)[1].lower()
+                    mime_type = {
+                        '.jpg': 'image/jpeg',
+                        '.jpeg': 'image/jpeg',
+                        '.png': 'image/png',
+                        '.gif': 'image/gif'
+                    }.get(file_extension, 'application/octet-stream')
+
+                    post_dict['thumbnail_file'] = {
+                        'data': base64_encoded,
+                        'mime_type': mime_type,
+                        'filename': os.path.basename(matching_file)
+                    }
+            except Exception as e:
+                logger.error(f"Error reading thumbnail file: {e}")
+                post_dict['thumbnail_file'] = None
+    return post_dict
+
+
+async def load_listing_page(post_type, base_url, limit, cursor):
+    """Listing snapshot loader: one default page, JSON-ready. Raises on DB errors, so a failed load is never stored."""
+    data, next_cursor = await run_db(get_post_page_mysql, post_type=post_type, limit=limit, cursor=cursor)
+    posts = await run_in_threadpool(lambda: [build_listing_post(row, base_url) for row in data])
+    return posts, next_cursor
+
+
+listing_snapshots = snapshots.ListingSnapshots(listing_cache, load_listing_page)
+
+
+def snapshot_response(request, page):
+    headers = {"ETag": page.etag, "Vary": "Accept-Encoding"}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=page.next_cursor)}>; rel="next"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and page.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    content, encoding = page.encoded(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@app.get("/get-posts/{post_type}", response_model=List[PostSummary])
+async def get_posts(
+    request: Request,
+    response: Response,
+    post_type: str,
+    offset_upper: Optional[int] = None,
+    offset_lower: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    inline_thumbnails: bool = False,
+    thumbnail_size: int = Query(DEFAULT_THUMBNAIL_SIZE, ge=1, le=4096),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$")
+):
+    """
+    List posts newest first. Pages are fetched by cursor: the next page's
+    cursor is returned in the X-Next-Cursor header (and a Link rel="next"
+    header) and is absent on the last page. offset_upper/offset_lower are
+    still accepted for older clients.
+
+    Thumbnails are returned as URLs to /thumbnails/{id}?size=thumbnail_size;
+    pass inline_thumbnails=true to embed the originals as base64 instead.
+
+    stream=ndjson (one post per line) or stream=json (a JSON array written
+    as it goes) streams the rows straight from the database instead, for
+    exports of large offset windows. Memory use and time to first byte do
+    not grow with the window. Streamed listings are not cached and carry no
+    next cursor.
+
+    The first pages of the default listing are served from pre-serialised,
+    pre-compressed snapshots (see snapshots.py) without touching the database.
+    """
+    resolve_post_type(post_type)
+
+    use_offsets = cursor is None and offset_upper is not None and offset_lower is not None
+
+    if (not stream and not use_offsets and not inline_thumbnails and limit == listing_snapshots.page_size
+            and thumbnail_size == DEFAULT_THUMBNAIL_SIZE):
+        page = await listing_snapshots.lookup(post_type, str(request.base_url), cursor)
+        if page is not None:
+            return snapshot_response(request, page)
+
+    def build_post(row):
+        return build_listing_post(row, request.base_url, thumbnail_size, inline_thumbnails)
+
+    if stream:
+        try:
+            rows = await run_in_threadpool(
+                PostStream, post_type,
+                offset_lower=offset_lower if use_offsets else None,
+                offset_upper=offset_upper if use_offsets else None,
+                limit=limit, cursor=cursor,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error streaming {post_type}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+        def encode(post):
+            return responses.dumps(build_post(post))
+
+        # One chunk per fetched batch; StreamingResponse pulls each from the threadpool
+        def ndjson_chunks():
+            for batch in rows.batches():
+                yield b"".join(encode(post) + b"\n" for post in batch)
+
+        def json_array_chunks():
+            separator = b"["
+            for batch in rows.batches():
+                yield separator + b",".join(encode(post) for post in batch)
+                separator = b","
+            yield b"[]" if separator == b"[" else b"]"
+
+        if stream == "ndjson":
+            return StreamingResponse(ndjson_chunks(), media_type="application/x-ndjson")
+        return StreamingResponse(json_array_chunks(), media_type="application/json")
+
+    async def load_page():
+        next_cursor = None
+        if use_offsets:
+            data = await run_db(get_post_mysql, post_type=post_type, offset_lower=offset_lower, offset_upper=offset_upper)
+        else:
+            data, next_cursor = await run_db(get_post_page_mysql, post_type=post_type, limit=limit, cursor=cursor)
+        return {"posts": await run_in_threadpool(build_posts, data), "next_cursor": next_cursor}
+
+    def build_posts(data):
+        return [build_post(row) for row in data]
+
+    key_parts = (
+        request.base_url,
+        f"o{offset_lower}-{offset_upper}" if use_offsets else f"c{cursor}",
+        limit,
+        inline_thumbnails,
+        thumbnail_size,
+    )
+    try:
+        page = await listing_cache.get_or_load(post_type, key_parts, load_page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing {post_type}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+        next_url = request.url.include_query_params(cursor=page["next_cursor"])
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return page["posts"]
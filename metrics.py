@@ -0,0 +1,218 @@
+import os
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+
+try:
+    import pyinstrument
+except ImportError:  # optional; cProfile is used instead
+    pyinstrument = None
+
+# In-process metrics exposed at GET /metrics in the Prometheus text format.
+# Updates are a dict lookup plus a lock-protected add, cheap enough for the
+# request and query hot paths. Values are per process; with several workers
+# each one is scraped separately.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests slower than this many milliseconds are profiled to PROFILE_DIR.
+# Unset (the default) disables profiling entirely.
+PROFILE_SLOW_REQUEST_MS = os.getenv("PROFILE_SLOW_REQUEST_MS")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(label) for label in labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines += self._render_sample(labels, value)
+        return lines
+
+    def _render_sample(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (the last slot is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _render_sample(self, labels, state):
+        counts, total = state
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{label_text} {total}")
+        lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def register_collector(collect):
+    """
+    Add a callable run at scrape time. It returns an iterable of
+    (name, documentation, labels dict, value) gauge samples, for values that
+    live elsewhere (cache counters, pool sizes) and are cheaper read than tracked.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """
+    Returns:
+    - str: every metric in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    for collect in _collectors:
+        seen = set()
+        for name, documentation, labels, value in collect():
+            if name not in seen:
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being handled")
+HTTP_RESPONSE_BYTES = Counter("http_response_bytes_total", "Response body bytes sent", ("route",))
+HTTP_COMPRESSION_BYTES = Counter(
+    "http_compression_bytes_total", "Response bytes before (in) and after (out) on-the-fly compression",
+    ("coding", "direction"),
+)
+HTTP_COMPRESSION_SECONDS = Counter("http_compression_cpu_seconds_total", "CPU time spent compressing responses", ("coding",))
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes received in uploaded files", ("field",))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Time spent in each data-access helper", ("function",))
+DB_QUEUE_SECONDS = Histogram("db_queue_wait_seconds", "Time a DB call waited for a free worker/connection")
+DB_ERRORS = Counter("db_errors_total", "Data-access helpers that raised", ("function",))
+DB_CALLS_IN_PROGRESS = Gauge("db_calls_in_progress", "DB calls holding a pooled connection")
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in profiler for slow requests. Each profiled request runs under
+    pyinstrument (async-aware) when installed, otherwise cProfile, and the
+    trace is written to PROFILE_DIR only if the request took longer than the
+    threshold. One request is profiled at a time; concurrent requests go
+    through unprofiled, since both profilers hook the whole thread.
+    """
+
+    def __init__(self, threshold_ms=PROFILE_SLOW_REQUEST_MS, directory=PROFILE_DIR):
+        self.threshold = float(threshold_ms) / 1000 if threshold_ms else None
+        self.directory = directory
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold is not None
+
+    def start(self):
+        """Returns a profiler handle, or None if profiling is off or already running."""
+        if not self.enabled or not self._busy.acquire(blocking=False):
+            return None
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def stop(self, profiler, method, route, elapsed):
+        """Stop the profiler; dump it if the request was slow. Returns the file written, if any."""
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            else:
+                profiler.stop()
+            if elapsed < self.threshold:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            name = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+            path = os.path.join(self.directory, f"{int(time.time() * 1000)}-{method}-{name}-{int(elapsed * 1000)}ms")
+            if isinstance(profiler, cProfile.Profile):
+                path += ".prof"
+                pstats.Stats(profiler).dump_stats(path)
+            else:
+                path += ".html"
+                with open(path, "w") as f:
+                    f.write(profiler.output_html())
+            return path
+        finally:
+            self._busy.release()
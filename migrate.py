@@ -0,0 +1,51 @@
+import os
+import sys
+
+from functions import get_db_connection
+
+# Applies migrations/*.sql in file-name order, recording each applied file in
+# schema_migrations so re-running only picks up new ones:
+#   python migrate.py
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def apply_migrations():
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "name VARCHAR(255) NOT NULL PRIMARY KEY, applied_at DATETIME NOT NULL)"
+        )
+        cursor.execute("SELECT name FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for name in sorted(os.listdir(MIGRATIONS_DIR)):
+            if not name.endswith(".sql") or name in applied:
+                continue
+            with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                statements = split_statements(f.read())
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (name, applied_at) VALUES (%s, NOW())", (name,)
+            )
+            connection.commit()
+            print(f"Applied {name}")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == "__main__":
+    try:
+        apply_migrations()
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,14 @@
+-- Post tables written by add_new_post_mysql. All post types share one shape.
+CREATE TABLE IF NOT EXISTS articles (
+    id VARCHAR(32) NOT NULL PRIMARY KEY,
+    description TEXT,
+    title VARCHAR(255) NOT NULL,
+    thumbnail VARCHAR(32),
+    author VARCHAR(255),
+    upload_date DATE NOT NULL,
+    changes_date DATE
+);
+
+CREATE TABLE IF NOT EXISTS guides LIKE articles;
+
+CREATE TABLE IF NOT EXISTS tutorials LIKE articles;
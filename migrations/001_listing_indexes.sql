@@ -0,0 +1,7 @@
+-- Supports keyset pagination in get_post_page_mysql:
+-- ORDER BY upload_date DESC, id DESC with (upload_date, id) range predicates.
+ALTER TABLE articles ADD INDEX idx_articles_listing (upload_date, id);
+
+ALTER TABLE guides ADD INDEX idx_guides_listing (upload_date, id);
+
+ALTER TABLE tutorials ADD INDEX idx_tutorials_listing (upload_date, id);
@@ -0,0 +1,6 @@
+-- Thumbnail ids from storage.new_thumbnail_id are 12 characters.
+ALTER TABLE articles MODIFY thumbnail VARCHAR(32);
+
+ALTER TABLE guides MODIFY thumbnail VARCHAR(32);
+
+ALTER TABLE tutorials MODIFY thumbnail VARCHAR(32);
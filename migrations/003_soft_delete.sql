@@ -0,0 +1,7 @@
+-- Deleted posts are first marked with deleted_at (hidden from every read)
+-- and purged, files first, by the background queue in deletions.py.
+ALTER TABLE articles ADD COLUMN deleted_at DATETIME NULL, ADD INDEX idx_articles_deleted (deleted_at);
+
+ALTER TABLE guides ADD COLUMN deleted_at DATETIME NULL, ADD INDEX idx_guides_deleted (deleted_at);
+
+ALTER TABLE tutorials ADD COLUMN deleted_at DATETIME NULL, ADD INDEX idx_tutorials_deleted (deleted_at);
@@ -0,0 +1,134 @@
+import os
+import re
+
+from storage import uploads_dir, thumbnails_root
+
+# The kinds of post the app serves. Each entry names its table and upload
+# folder, the media files it carries besides the thumbnail and markdown,
+# and which of them an upload must include. The SQL each type needs is
+# built once here, so handlers and DB helpers only look statements up, and
+# a table name or column never comes from a request. Adding a content type
+# means adding a register() call below (plus its table, see migrations/).
+# Reads and updates only see live rows; rows with deleted_at set wait for
+# deletions.py to purge them.
+
+# Columns a client may change through /update-post and the batch endpoints
+TEXT_FIELDS = ("title", "description", "author")
+# Legacy and current IDs: base62 (storage.new_id) or older url-safe tokens
+ID_RE = re.compile(r"^[0-9A-Za-z_-]{1,32}$")
+
+LISTING_COLUMNS = "id, description, title, thumbnail, author, upload_date AS created_at, changes_date AS updated_at"
+LISTING_ORDER = "ORDER BY upload_date DESC, id DESC"
+LIVE = "deleted_at IS NULL"
+ROW_COLUMNS = ("id", "description", "title", "thumbnail", "author", "upload_date", "changes_date")
+
+
+class PostType:
+    """
+    Parameters:
+    - name: str - URL segment, table name and folder under uploads/
+    - media: tuple - media fields besides thumbnail and markdown, e.g. ("banner",)
+    - required_media: tuple - the subset of media an upload must include
+    """
+
+    def __init__(self, name, media=(), required_media=()):
+        if not re.match(r"^[a-z_]+$", name):
+            raise ValueError(f"Invalid post type name '{name}'")
+        self.name = name
+        self.table = name
+        self.media = tuple(media)
+        self.required_media = tuple(required_media)
+        # Fields /update-post accepts a file for ("thumbnails" is the historical name)
+        self.file_fields = ("thumbnails", "markdown") + self.media
+        self.directory = os.path.join(uploads_dir(), name)
+        self.sql = self._build_statements()
+
+    def _build_statements(self):
+        table = self.table
+        return {
+            "insert": f"INSERT INTO {table} (id, description, title, thumbnail, author, upload_date) "
+                      f"VALUES (%s, %s, %s, %s, %s, %s)",
+            "bulk_insert": f"INSERT IGNORE INTO {table} ({', '.join(ROW_COLUMNS)}) "
+                           f"VALUES ({', '.join(['%s'] * len(ROW_COLUMNS))})",
+            "touch": f"UPDATE {table} SET changes_date = %s WHERE id = %s AND {LIVE}",
+            "update": {
+                field: f"UPDATE {table} SET {field} = %s, changes_date = %s WHERE id = %s AND {LIVE}"
+                for field in TEXT_FIELDS
+            },
+            "soft_delete": f"UPDATE {table} SET deleted_at = %s WHERE id = %s AND {LIVE}",
+            "pending_purge": f"SELECT id, thumbnail FROM {table} WHERE deleted_at IS NOT NULL "
+                             f"ORDER BY deleted_at LIMIT %s",
+            "count_pending_purge": f"SELECT COUNT(*) FROM {table} WHERE deleted_at IS NOT NULL",
+            "thumbnail": f"SELECT thumbnail FROM {table} WHERE id = %s AND {LIVE}",
+            "by_id": f"SELECT {LISTING_COLUMNS} FROM {table} WHERE id = %s AND {LIVE}",
+            "page": f"SELECT {LISTING_COLUMNS} FROM {table} WHERE {LIVE} {LISTING_ORDER} LIMIT %s",
+            "page_after": f"SELECT {LISTING_COLUMNS} FROM {table} "
+                          f"WHERE {LIVE} AND (upload_date < %s OR (upload_date = %s AND id < %s)) "
+                          f"{LISTING_ORDER} LIMIT %s",
+            "offset_page": f"SELECT {LISTING_COLUMNS} FROM {table} WHERE {LIVE} {LISTING_ORDER} LIMIT %s OFFSET %s",
+            "search_rows": f"SELECT id, title, description, author FROM {table} WHERE {LIVE}",
+        }
+
+    def update_statement(self, field):
+        """
+        Raises:
+        - ValueError: If field is not a client-updatable column
+        """
+        try:
+            return self.sql["update"][field]
+        except KeyError:
+            raise ValueError(f"Field '{field}' cannot be updated") from None
+
+    def select_in(self, columns, key, count, live_only=False):
+        """SELECT columns WHERE key IN (count placeholders); columns and key are trusted callers' constants."""
+        live = f" AND {LIVE}" if live_only else ""
+        return f"SELECT {columns} FROM {self.table} WHERE {key} IN ({', '.join(['%s'] * count)}){live}"
+
+    def soft_delete_in(self, count):
+        return f"UPDATE {self.table} SET deleted_at = %s WHERE id IN ({', '.join(['%s'] * count)}) AND {LIVE}"
+
+    def purge_in(self, count):
+        """Final removal of rows already marked deleted."""
+        return f"DELETE FROM {self.table} WHERE id IN ({', '.join(['%s'] * count)}) AND deleted_at IS NOT NULL"
+
+    def create_directories(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+
+REGISTRY = {}
+
+
+def register(post_type):
+    REGISTRY[post_type.name] = post_type
+    return post_type
+
+
+def get(name):
+    """
+    Raises:
+    - ValueError: If name is not a registered post type
+    """
+    post_type = REGISTRY.get(name)
+    if post_type is None:
+        raise ValueError(f"Invalid post type. Must be one of: {', '.join(REGISTRY)}")
+    return post_type
+
+
+def names():
+    return tuple(REGISTRY)
+
+
+def valid_id(value):
+    return bool(value) and ID_RE.match(value) is not None
+
+
+def create_directories():
+    """Called once at startup instead of on every upload."""
+    os.makedirs(thumbnails_root(), exist_ok=True)
+    for post_type in REGISTRY.values():
+        post_type.create_directories()
+
+
+register(PostType("articles", media=("banner",), required_media=("banner",)))
+register(PostType("guides", media=("banner",), required_media=("banner",)))
+register(PostType("tutorials", media=("video",), required_media=("video",)))
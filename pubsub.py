@@ -0,0 +1,148 @@
+import os
+import json
+import uuid
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fire-and-forget messages between the workers of one deployment, used to
+# keep per-process state (listing cache generations, the thumbnail index)
+# in step. Three implementations share publish/subscribe/close:
+#   local  - in-process only; the default for a single worker and for tests
+#   unix   - datagrams between the workers on one host, through sockets in
+#            uploads/.bus/; no extra services needed
+#   redis  - Redis PUBLISH/SUBSCRIBE, for workers on several hosts
+# Delivery is best effort; every subscriber must tolerate a lost message
+# (both current users fall back to disk or a TTL).
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local")
+PUBSUB_SOCKET_DIR = os.getenv("PUBSUB_SOCKET_DIR", os.path.join(os.getcwd(), "uploads", ".bus"))
+PUBSUB_CHANNEL_PREFIX = os.getenv("PUBSUB_CHANNEL_PREFIX", "fibohack")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class _Bus:
+    def __init__(self):
+        # Messages carry the sender's id so a worker ignores its own
+        self.origin = uuid.uuid4().hex
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, callback):
+        """callback(message: dict) runs on the bus thread for messages from other workers."""
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def _encode(self, channel, message):
+        return json.dumps({"channel": channel, "origin": self.origin, "message": message}).encode("utf-8")
+
+    def _deliver(self, payload):
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            return
+        if envelope.get("origin") == self.origin:
+            return
+        with self._lock:
+            callbacks = list(self._subscribers.get(envelope.get("channel"), ()))
+        for callback in callbacks:
+            try:
+                callback(envelope["message"])
+            except Exception as e:
+                logger.error("Subscriber of %s failed: %s", envelope.get("channel"), e)
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalBus(_Bus):
+    """Single process: there are no other workers, so publish is a no-op."""
+
+    def publish(self, channel, message):
+        pass
+
+
+class UnixSocketBus(_Bus):
+    """
+    Each worker binds a datagram socket named <pid>-<origin>.sock in
+    PUBSUB_SOCKET_DIR and publishing sends the message to every socket there. Sockets of
+    workers that have exited are removed the first time a send to them fails.
+    """
+
+    MAX_DATAGRAM = 64 * 1024
+
+    def __init__(self, directory=PUBSUB_SOCKET_DIR):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{os.getpid()}-{self.origin[:8]}.sock")
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._closed = False
+        threading.Thread(target=self._listen, name="pubsub", daemon=True).start()
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                payload = self._socket.recv(self.MAX_DATAGRAM)
+            except OSError:
+                break
+            self._deliver(payload)
+
+    def publish(self, channel, message):
+        payload = self._encode(channel, message)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".sock") or path == self.path:
+                continue
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker is gone
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Dropped %s message: receiver %s is backed up", channel, name)
+
+    def close(self):
+        self._closed = True
+        self._socket.close()
+        self._sender.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class RedisBus(_Bus):
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{f"{PUBSUB_CHANNEL_PREFIX}:*": lambda item: self._deliver(item["data"])})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, channel, message):
+        self.client.publish(f"{PUBSUB_CHANNEL_PREFIX}:{channel}", self._encode(channel, message))
+
+    def close(self):
+        self._thread.stop()
+        self._pubsub.close()
+
+
+def create_bus(name=PUBSUB_BACKEND):
+    if name == "unix":
+        return UnixSocketBus()
+    if name == "redis":
+        import redis
+        return RedisBus(redis.Redis.from_url(REDIS_URL))
+    return LocalBus()
@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+
+import storage
+import images
+import resumable
+import blobstore
+import posttypes
+import deletions
+from functions import existing_post_ids_mysql, existing_thumbnail_ids_mysql, call_db
+
+# Removes files that no database row refers to: staging folders of uploads
+# that never committed, post folders and thumbnails whose row is gone (e.g.
+# the process died between renaming files into place and COMMIT), ID
+# reservations of workers that died mid-upload, trashed folders of purges
+# that were interrupted, and then any blobs that were only referenced by
+# them. Resumable upload sessions are removed once no chunk has arrived for
+# RESUMABLE_SESSION_TTL seconds. Only entries older than
+# RECONCILE_GRACE seconds are considered, so uploads in flight are never
+# touched. main.py runs it every RECONCILE_INTERVAL seconds; it can also be
+# run by hand:
+#   python reconcile.py [--dry-run]
+
+RECONCILE_GRACE = int(os.getenv("RECONCILE_GRACE", "3600"))
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", "3600"))
+POST_TYPES = posttypes.names()
+CHECK_BATCH = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _older_than(path, cutoff):
+    try:
+        return os.stat(path).st_mtime < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def _in_batches(items, size=CHECK_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def stale_staging_dirs(cutoff, root=None):
+    root = root or storage.staging_root()
+    if not os.path.isdir(root):
+        return []
+    return [entry.path for entry in os.scandir(root) if entry.is_dir() and _older_than(entry.path, cutoff)]
+
+
+def stale_reservations(cutoff):
+    root = storage.reservations_root()
+    if not os.path.isdir(root):
+        return []
+    stale = []
+    for kind in os.scandir(root):
+        if kind.is_dir():
+            stale += [entry.path for entry in os.scandir(kind.path) if _older_than(entry.path, cutoff)]
+    return stale
+
+
+def orphan_post_dirs(post_type, cutoff):
+    """Post folders older than cutoff without a row in post_type."""
+    candidates = {}
+    for path in storage.iter_post_dirs(os.path.join(storage.uploads_dir(), post_type)):
+        if _older_than(path, cutoff):
+            candidates[os.path.basename(path)] = path
+    orphans = []
+    for batch in _in_batches(list(candidates)):
+        existing = call_db(existing_post_ids_mysql, post_type, batch)
+        orphans += [candidates[post_id] for post_id in batch if post_id not in existing]
+    return orphans
+
+
+def orphan_thumbnails(cutoff):
+    """Thumbnail files older than cutoff that no post references."""
+    root = storage.thumbnails_root()
+    candidates = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root and "renditions" in dirnames:
+            dirnames.remove("renditions")
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if not name.endswith(storage.TEMP_SUFFIX) and _older_than(path, cutoff):
+                candidates[os.path.splitext(name)[0]] = path
+    orphans = []
+    for batch in _in_batches(list(candidates)):
+        existing = call_db(existing_thumbnail_ids_mysql, batch, POST_TYPES)
+        orphans += [(thumbnail_id, candidates[thumbnail_id]) for thumbnail_id in batch if thumbnail_id not in existing]
+    return orphans
+
+
+def reconcile(grace=RECONCILE_GRACE, dry_run=False):
+    """
+    Returns:
+    - dict: number of staging folders, reservations, resumable sessions, trashed folders, post
+      folders, thumbnails and blobs removed
+    """
+    cutoff = time.time() - grace
+    removed = {
+        "staging": 0, "reservations": 0, "resumable": 0, "trash": 0, "posts": 0, "thumbnails": 0, "blobs": 0,
+    }
+
+    for path in stale_staging_dirs(cutoff):
+        logger.info("Removing abandoned upload %s", path)
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        removed["staging"] += 1
+
+    for path in stale_reservations(cutoff):
+        logger.info("Releasing expired ID reservation %s", path)
+        if not dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        removed["reservations"] += 1
+
+    for path in resumable.expired_sessions(time.time() - max(grace, resumable.RESUMABLE_SESSION_TTL)):
+        logger.info("Removing expired resumable upload %s", path)
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        removed["resumable"] += 1
+
+    for path in stale_staging_dirs(cutoff, deletions.trash_root()):
+        logger.info("Removing interrupted purge %s", path)
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        removed["trash"] += 1
+
+    for post_type in POST_TYPES:
+        for path in orphan_post_dirs(post_type, cutoff):
+            logger.info("Removing orphaned post folder %s", path)
+            if not dry_run:
+                shutil.rmtree(path, ignore_errors=True)
+            removed["posts"] += 1
+
+    for thumbnail_id, path in orphan_thumbnails(cutoff):
+        logger.info("Removing orphaned thumbnail %s", path)
+        if not dry_run:
+            images.remove_renditions(images.thumbnail_renditions_dir(storage.thumbnails_root(), thumbnail_id))
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        removed["thumbnails"] += 1
+
+    # Blobs only the removed files linked to now have a link count of one
+    if not dry_run and any(removed.values()):
+        removed["blobs"] = blobstore.collect_garbage(min_age=grace)
+    return removed
+
+
+async def reconcile_loop(interval=RECONCILE_INTERVAL):
+    """Background task: run reconcile() every `interval` seconds, off the event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await loop.run_in_executor(None, reconcile)
+            if any(removed.values()):
+                logger.info("Reconciled uploads: %s", removed)
+        except Exception as e:
+            logger.error("Reconciling uploads failed: %s", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove upload files no post refers to")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--grace", type=int, default=RECONCILE_GRACE, help="ignore entries newer than this many seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        print(reconcile(args.grace, args.dry_run))
+    except Exception as e:
+        print(f"Reconcile failed: {e}")
+        sys.exit(1)
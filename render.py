@@ -0,0 +1,157 @@
+import os
+import html
+import uuid
+import hashlib
+import logging
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import markdown as markdown_lib
+except ImportError:
+    markdown_lib = None
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists", "toc"]
+
+HASH_FILENAME = "markdown.sha256"
+
+_render_pool = None
+
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _render_pool
+
+
+def shutdown_render_pool():
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_markdown(text):
+    """Runs in a worker process."""
+    if markdown_lib is None:
+        return f"<pre>{html.escape(text)}</pre>"
+    return markdown_lib.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+
+
+def find_markdown_file(post_folder):
+    default_path = os.path.join(post_folder, "markdown.md")
+    if os.path.isfile(default_path):
+        return default_path
+    # update_post keeps the uploaded extension, e.g. markdown.txt
+    for file in os.listdir(post_folder):
+        if file.startswith("markdown.") and not file.endswith((".html", ".sha256", ".part")):
+            return os.path.join(post_folder, file)
+    return None
+
+
+def write_markdown_hash(post_folder, digest):
+    """Record the sha256 of the current markdown so reads never re-hash it."""
+    with open(os.path.join(post_folder, HASH_FILENAME), "w") as f:
+        f.write(digest)
+
+
+def markdown_hash(post_folder):
+    hash_path = os.path.join(post_folder, HASH_FILENAME)
+    if os.path.isfile(hash_path):
+        with open(hash_path) as f:
+            return f.read().strip()
+    markdown_path = find_markdown_file(post_folder)
+    if markdown_path is None:
+        return None
+    digest = hashlib.sha256()
+    with open(markdown_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    write_markdown_hash(post_folder, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def rendered_path(post_folder, digest):
+    return os.path.join(post_folder, f"markdown.{digest[:16]}.html")
+
+
+def _remove_stale_renders(post_folder, keep=None):
+    for file in os.listdir(post_folder):
+        if file.startswith("markdown.") and file.endswith(".html") and file != keep:
+            os.remove(os.path.join(post_folder, file))
+
+
+def invalidate_rendered(post_folder):
+    """Forget the cached hash and HTML after the markdown is replaced."""
+    hash_path = os.path.join(post_folder, HASH_FILENAME)
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
+    _remove_stale_renders(post_folder)
+
+
+def replace_markdown(post_folder, filename, digest):
+    """
+    After `filename` (e.g. markdown.txt) was written as the post's new
+    markdown: remove the previous source if its extension differed, drop the
+    cached hash and HTML, and record digest. Blocking; run it in a thread.
+    """
+    for file in os.listdir(post_folder):
+        if file.startswith("markdown.") and file != filename and not file.endswith((".html", HASH_FILENAME, ".part")):
+            os.remove(os.path.join(post_folder, file))
+    invalidate_rendered(post_folder)
+    write_markdown_hash(post_folder, digest)
+
+
+def _read_rendered(cached_path):
+    try:
+        with open(cached_path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _read_markdown(post_folder):
+    with open(find_markdown_file(post_folder), encoding="utf-8") as f:
+        return f.read()
+
+
+def _write_rendered(post_folder, cached_path, rendered):
+    tmp_path = f"{cached_path}.{uuid.uuid4().hex}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(rendered)
+    os.replace(tmp_path, cached_path)
+    _remove_stale_renders(post_folder, keep=os.path.basename(cached_path))
+
+
+async def get_rendered_html(post_folder):
+    """
+    Return the post's rendered HTML, rendering it in the process pool and
+    caching it on disk next to markdown.md when the content hash is new.
+
+    Returns:
+    - tuple: (html str, markdown sha256) or (None, None) if there is no markdown
+    """
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, markdown_hash, post_folder)
+    if digest is None:
+        return None, None
+
+    cached_path = rendered_path(post_folder, digest)
+    cached = await loop.run_in_executor(None, _read_rendered, cached_path)
+    if cached is not None:
+        return cached, digest
+
+    text = await loop.run_in_executor(None, _read_markdown, post_folder)
+    rendered = await loop.run_in_executor(get_render_pool(), render_markdown, text)
+    await loop.run_in_executor(None, _write_rendered, post_folder, cached_path, rendered)
+    return rendered, digest
+
+
+async def prerender_markdown(post_folder):
+    """Background task: warm the render cache after an upload or update."""
+    try:
+        await get_rendered_html(post_folder)
+    except Exception as e:
+        logger.error("Error rendering markdown in %s: %s", post_folder, e)
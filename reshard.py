@@ -0,0 +1,77 @@
+import os
+import sys
+import argparse
+
+from storage import uploads_dir, is_shard_name, shard_parts, sharded_post_dir
+from images import thumbnail_renditions_dir
+import posttypes
+
+# Moves a flat uploads/ tree into the sharded layout while the app is
+# running:
+#   python reshard.py [--dry-run]
+# Every move is a single rename on the same filesystem, and readers resolve
+# the sharded path first and fall back to the flat one, so a post is always
+# reachable at one of the two locations.
+
+POST_TYPES = posttypes.names()
+
+
+def reshard_posts(post_type, dry_run=False):
+    type_dir = os.path.join(uploads_dir(), post_type)
+    if not os.path.isdir(type_dir):
+        return 0
+    moved = 0
+    for entry in os.scandir(type_dir):
+        if not entry.is_dir() or is_shard_name(entry.name) or entry.name.startswith("."):
+            continue
+        target = sharded_post_dir(post_type, entry.name)
+        print(f"{entry.path} -> {target}")
+        if not dry_run:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(entry.path, target)
+        moved += 1
+    return moved
+
+
+def reshard_thumbnails(dry_run=False):
+    thumbnails_dir = os.path.join(uploads_dir(), "thumbnails")
+    if not os.path.isdir(thumbnails_dir):
+        return 0
+    moved = 0
+    for entry in os.scandir(thumbnails_dir):
+        if not entry.is_file() or entry.name.endswith(".part"):
+            continue
+        thumbnail_id = os.path.splitext(entry.name)[0]
+        target = os.path.join(thumbnails_dir, *shard_parts(thumbnail_id), entry.name)
+        print(f"{entry.path} -> {target}")
+        if not dry_run:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(entry.path, target)
+        moved += 1
+
+    # Renditions built before sharding live at renditions/<id>
+    renditions_dir = os.path.join(thumbnails_dir, "renditions")
+    if os.path.isdir(renditions_dir):
+        for entry in os.scandir(renditions_dir):
+            if not entry.is_dir() or is_shard_name(entry.name):
+                continue
+            target = thumbnail_renditions_dir(thumbnails_dir, entry.name)
+            print(f"{entry.path} -> {target}")
+            if not dry_run:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.rename(entry.path, target)
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move flat upload folders into hash-prefix shards")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        total = sum(reshard_posts(post_type, args.dry_run) for post_type in POST_TYPES)
+        total += reshard_thumbnails(args.dry_run)
+    except OSError as e:
+        print(f"Reshard failed: {e}")
+        sys.exit(1)
+    print(f"{'Would move' if args.dry_run else 'Moved'} {total} entries")
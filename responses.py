@@ -0,0 +1,54 @@
+import json
+import decimal
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; the standard json module is used instead
+    orjson = None
+
+# JSON encoding for response bodies and cached values. With orjson
+# installed, encoding a listing page is several times faster than
+# jsonable_encoder() followed by json.dumps(), and dates and datetimes are
+# written natively (ISO 8601) instead of being converted one by one first.
+# Both paths produce the same compact UTF-8 output, so ETags computed over
+# it do not depend on which one ran.
+#
+# Routes with a response_model (see PostSummary in main.py) do not need
+# this: FastAPI serialises them straight to bytes with pydantic.
+
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content):
+    """
+    Returns:
+    - bytes: compact UTF-8 JSON of content
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that skips jsonable_encoder; content may hold dates, datetimes and models."""
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+
+MB = 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", str(8 * MB)))
+MAX_CHUNK_SIZE = int(os.getenv("RESUMABLE_MAX_CHUNK_SIZE", str(64 * MB)))
+# Sessions without a chunk written for this long are removed by reconcile.py
+RESUMABLE_SESSION_TTL = int(os.getenv("RESUMABLE_SESSION_TTL", str(24 * 3600)))
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ResumableUploadError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def uploads_root():
+    return os.path.abspath(os.path.join(os.getcwd(), "uploads", ".resumable"))
+
+
+def _upload_dir(upload_id):
+    if not _UPLOAD_ID_RE.match(upload_id or ""):
+        raise ResumableUploadError(404, "Upload not found")
+    path = os.path.join(uploads_root(), upload_id)
+    if not os.path.isdir(path):
+        raise ResumableUploadError(404, "Upload not found")
+    return path
+
+
+def load_manifest(upload_id):
+    with open(os.path.join(_upload_dir(upload_id), "manifest.json")) as f:
+        return json.load(f)
+
+
+def _save_manifest(upload_id, manifest):
+    path = os.path.join(_upload_dir(upload_id), "manifest.json")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def chunk_bounds(manifest, index):
+    """
+    Returns:
+    - tuple: (offset, length) of chunk `index` inside the assembled file
+    """
+    if index < 0 or index >= manifest["chunk_count"]:
+        raise ResumableUploadError(416, f"Chunk index must be between 0 and {manifest['chunk_count'] - 1}")
+    offset = index * manifest["chunk_size"]
+    return offset, min(manifest["chunk_size"], manifest["total_size"] - offset)
+
+
+def initiate_upload(post_type, filename, total_size, chunk_size=None, post_id=None, max_bytes=None):
+    """
+    Create an upload session. The target file is preallocated (sparse) at its
+    final size so chunks can be written straight to their offsets in any
+    order, and finalizing is a rename rather than a concatenation.
+
+    Returns:
+    - dict: the session manifest, including upload_id and chunk_count
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if total_size <= 0:
+        raise ResumableUploadError(400, "total_size must be positive")
+    if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+        raise ResumableUploadError(400, f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+    if max_bytes is not None and total_size > max_bytes:
+        raise ResumableUploadError(413, f"video exceeds the {max_bytes} byte limit")
+
+    upload_id = uuid.uuid4().hex
+    upload_dir = os.path.join(uploads_root(), upload_id)
+    os.makedirs(os.path.join(upload_dir, "chunks"))
+
+    with open(os.path.join(upload_dir, "data.part"), "wb") as f:
+        f.truncate(total_size)
+
+    manifest = {
+        "upload_id": upload_id,
+        "post_type": post_type,
+        "post_id": post_id,
+        "filename": filename,
+        "extension": os.path.splitext(filename)[1] or ".mp4",
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "chunk_count": (total_size + chunk_size - 1) // chunk_size,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(upload_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def open_chunk_writer(upload_id, index):
+    """
+    Returns:
+    - tuple: (manifest, file descriptor, offset, expected length) for writing chunk `index`
+
+    Raises:
+    - ResumableUploadError: 409 once the upload is finalized; data.part is then
+      linked into a post folder and the blob store, and must not change
+    """
+    manifest = load_manifest(upload_id)
+    if manifest.get("finalized"):
+        raise ResumableUploadError(409, "Upload already finalized")
+    offset, length = chunk_bounds(manifest, index)
+    fd = os.open(os.path.join(_upload_dir(upload_id), "data.part"), os.O_WRONLY)
+    return manifest, fd, offset, length
+
+
+def write_at(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def commit_chunk(upload_id, fd, index):
+    """Flush a fully written chunk and mark it as received."""
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    open(os.path.join(_upload_dir(upload_id), "chunks", str(index)), "w").close()
+
+
+def received_chunks(upload_id):
+    chunks_dir = os.path.join(_upload_dir(upload_id), "chunks")
+    return sorted(int(name) for name in os.listdir(chunks_dir))
+
+
+def upload_status(upload_id):
+    """
+    Returns:
+    - dict: manifest plus received chunk indices, missing indices and the
+      received byte ranges (inclusive, merged)
+    """
+    manifest = load_manifest(upload_id)
+    received = received_chunks(upload_id)
+    received_set = set(received)
+
+    ranges = []
+    for index in received:
+        start, length = chunk_bounds(manifest, index)
+        end = start + length - 1
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+
+    return {
+        **manifest,
+        "received_chunks": received,
+        "missing_chunks": [i for i in range(manifest["chunk_count"]) if i not in received_set],
+        "received_ranges": ranges,
+        "received_bytes": sum(end - start + 1 for start, end in ranges),
+    }
+
+
+def finalize_upload(upload_id, post_type, post_folder_path):
+    """
+    Link a completed upload into a post folder as video<ext>, replacing any
+    previous video. The session is kept, so the upload can be finalized again
+    if what follows fails; call complete_upload() once the post is committed.
+
+    Returns:
+    - tuple: (new video file name, its path)
+    """
+    status = upload_status(upload_id)
+    if status["post_type"] != post_type:
+        raise ResumableUploadError(400, f"Upload was started for {status['post_type']}")
+    if status["missing_chunks"]:
+        raise ResumableUploadError(409, f"Upload incomplete, {len(status['missing_chunks'])} chunks missing")
+    if not os.path.isdir(post_folder_path):
+        raise ResumableUploadError(404, "Post folder not found")
+
+    # Refuse further chunk writes before data.part is shared with the post
+    if not status.get("finalized"):
+        manifest = load_manifest(upload_id)
+        manifest["finalized"] = True
+        _save_manifest(upload_id, manifest)
+
+    upload_dir = _upload_dir(upload_id)
+    new_filename = f"video{status['extension']}"
+    new_path = os.path.join(post_folder_path, new_filename)
+    tmp_path = f"{new_path}.{uuid.uuid4().hex}.part"
+    try:
+        os.link(os.path.join(upload_dir, "data.part"), tmp_path)
+    except OSError:
+        # No hard links on this filesystem
+        shutil.copyfile(os.path.join(upload_dir, "data.part"), tmp_path)
+    os.replace(tmp_path, new_path)
+    for file in os.listdir(post_folder_path):
+        if file.startswith("video.") and file != new_filename:
+            os.remove(os.path.join(post_folder_path, file))
+    return new_filename, new_path
+
+
+def complete_upload(upload_id):
+    """Remove a finalized session; its video lives on in the post folder."""
+    if _UPLOAD_ID_RE.match(upload_id or ""):
+        shutil.rmtree(os.path.join(uploads_root(), upload_id), ignore_errors=True)
+
+
+def _last_activity(upload_dir):
+    latest = 0
+    for path in (upload_dir, os.path.join(upload_dir, "chunks"), os.path.join(upload_dir, "data.part")):
+        try:
+            latest = max(latest, os.stat(path).st_mtime)
+        except FileNotFoundError:
+            pass
+    return latest
+
+
+def expired_sessions(cutoff):
+    """
+    Returns:
+    - list: directories of sessions with no chunk written since cutoff
+    """
+    root = uploads_root()
+    if not os.path.isdir(root):
+        return []
+    return [entry.path for entry in os.scandir(root) if entry.is_dir() and _last_activity(entry.path) < cutoff]
+
+
+def abort_upload(upload_id):
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import uploads_dir, post_dir
+from render import find_markdown_file
+import posttypes
+
+# Full-text index over title, description, author and the markdown body,
+# kept in a local SQLite FTS5 database. upload/update/delete maintain it
+# incrementally; `python search.py rebuild` re-indexes everything from
+# MySQL and the uploads/ tree.
+#
+# post_id and post_type are UNINDEXED in the FTS table, so matching writes on
+# them would scan every row. post_rows maps each post to its FTS rowid and
+# all updates and deletes go through it.
+
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", os.path.join(uploads_dir(), ".search.db"))
+REBUILD_WORKERS = int(os.getenv("SEARCH_REBUILD_WORKERS", "8"))
+POST_TYPES = posttypes.names()
+
+# bm25 weights, in column order: post_id, post_type, title, description, author, body
+BM25_WEIGHTS = "0, 0, 10.0, 4.0, 2.0, 1.0"
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+_TOKEN_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+
+def get_connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        os.makedirs(os.path.dirname(SEARCH_DB_PATH), exist_ok=True)
+        connection = sqlite3.connect(SEARCH_DB_PATH, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        has_post_rows = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_rows'"
+        ).fetchone()
+        connection.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS posts USING fts5(
+                post_id UNINDEXED, post_type UNINDEXED,
+                title, description, author, body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
+            )
+            """
+        )
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS post_rows (
+                post_type TEXT NOT NULL,
+                post_id TEXT NOT NULL,
+                fts_rowid INTEGER NOT NULL,
+                PRIMARY KEY (post_type, post_id)
+            ) WITHOUT ROWID
+            """
+        )
+        if not has_post_rows:
+            # Index built before post_rows existed
+            with _write_lock, connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO post_rows (post_type, post_id, fts_rowid) "
+                    "SELECT post_type, post_id, rowid FROM posts"
+                )
+        _local.connection = connection
+    return connection
+
+
+def _fts_rowid(connection, post_type, post_id):
+    row = connection.execute(
+        "SELECT fts_rowid FROM post_rows WHERE post_type = ? AND post_id = ?", (post_type, post_id)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _update_row(connection, post_type, post_id, fields):
+    rowid = _fts_rowid(connection, post_type, post_id)
+    if rowid is not None:
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        connection.execute(f"UPDATE posts SET {assignments} WHERE rowid = ?", (*fields.values(), rowid))
+
+
+def _delete_row(connection, post_type, post_id):
+    rowid = _fts_rowid(connection, post_type, post_id)
+    if rowid is not None:
+        connection.execute("DELETE FROM posts WHERE rowid = ?", (rowid,))
+        connection.execute("DELETE FROM post_rows WHERE post_type = ? AND post_id = ?", (post_type, post_id))
+
+
+def read_body(post_type, post_id):
+    folder = post_dir(post_type, post_id)
+    if not os.path.isdir(folder):
+        return ""
+    markdown_path = find_markdown_file(folder)
+    if markdown_path is None:
+        return ""
+    with open(markdown_path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def index_post(post_type, post_id, title, description, author, body=None):
+    """Insert or replace a post. The body is read from disk when not given."""
+    if body is None:
+        body = read_body(post_type, post_id)
+    connection = get_connection()
+    with _write_lock, connection:
+        _delete_row(connection, post_type, post_id)
+        cursor = connection.execute(
+            "INSERT INTO posts (post_id, post_type, title, description, author, body) VALUES (?, ?, ?, ?, ?, ?)",
+            (post_id, post_type, title, description, author, body),
+        )
+        connection.execute(
+            "INSERT INTO post_rows (post_type, post_id, fts_rowid) VALUES (?, ?, ?)",
+            (post_type, post_id, cursor.lastrowid),
+        )
+
+
+def update_post_fields(post_type, post_id, **fields):
+    """Update indexed metadata columns (title, description, author)."""
+    fields = {key: value for key, value in fields.items() if key in ("title", "description", "author")}
+    if not fields:
+        return
+    connection = get_connection()
+    with _write_lock, connection:
+        _update_row(connection, post_type, post_id, fields)
+
+
+def update_post_body(post_type, post_id):
+    """Re-read markdown.md after it has been replaced."""
+    body = read_body(post_type, post_id)
+    connection = get_connection()
+    with _write_lock, connection:
+        _update_row(connection, post_type, post_id, {"body": body})
+
+
+def remove_post(post_type, post_id):
+    connection = get_connection()
+    with _write_lock, connection:
+        _delete_row(connection, post_type, post_id)
+
+
+def remove_posts(post_type, post_ids):
+    connection = get_connection()
+    with _write_lock, connection:
+        for post_id in post_ids:
+            _delete_row(connection, post_type, post_id)
+
+
+def update_posts_fields(post_type, updates):
+    """Apply (post_id, field, value) updates from a batch in one transaction."""
+    connection = get_connection()
+    with _write_lock, connection:
+        for post_id, field, value in updates:
+            if field in ("title", "description", "author"):
+                _update_row(connection, post_type, post_id, {field: value})
+
+
+def build_match_query(text):
+    """
+    Turn user input into an FTS5 query: every word must match, words ending in
+    * match as prefixes, and the last word is always a prefix so results show
+    up while the user is still typing.
+    """
+    tokens = _TOKEN_RE.findall(text)
+    terms = []
+    for i, token in enumerate(tokens):
+        word = token.rstrip("*")
+        if not word:
+            continue
+        prefix = token.endswith("*") or i == len(tokens) - 1
+        terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search(text, post_type=None, limit=20, offset=0):
+    """
+    Returns:
+    - list: dicts with post_id, post_type, title, description, author, snippet and score,
+      best match first
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+    query = f"""
+        SELECT post_id, post_type, title, description, author,
+               snippet(posts, 5, '<mark>', '</mark>', '…', 16) AS snippet,
+               bm25(posts, {BM25_WEIGHTS}) AS score
+        FROM posts
+        WHERE posts MATCH ?
+    """
+    values = [match]
+    if post_type:
+        query += " AND post_type = ?"
+        values.append(post_type)
+    query += " ORDER BY score LIMIT ? OFFSET ?"
+    values += [limit, offset]
+
+    connection = get_connection()
+    connection.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in connection.execute(query, values)]
+    finally:
+        connection.row_factory = None
+
+
+def rebuild(post_types=POST_TYPES, workers=REBUILD_WORKERS):
+    """
+    Re-index every post. Rows come from MySQL, markdown bodies are read in
+    parallel, and the index is swapped in one transaction so searches keep
+    seeing the old contents until the new ones are complete.
+
+    Returns:
+    - int: number of posts indexed
+    """
+    from functions import get_db_connection
+
+    rows = []
+    db_connection = get_db_connection()
+    cursor = db_connection.cursor()
+    try:
+        for post_type in post_types:
+            cursor.execute(posttypes.get(post_type).sql["search_rows"])
+            rows += [(post_type, *row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        db_connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        bodies = list(pool.map(lambda row: read_body(row[0], row[1]), rows))
+
+    connection = get_connection()
+    with _write_lock, connection:
+        connection.execute("DELETE FROM posts")
+        connection.execute("DELETE FROM post_rows")
+        connection.executemany(
+            "INSERT INTO posts (rowid, post_type, post_id, title, description, author, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(rowid, *row, body) for rowid, (row, body) in enumerate(zip(rows, bodies), 1)],
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO post_rows (post_type, post_id, fts_rowid) VALUES (?, ?, ?)",
+            [(row[0], row[1], rowid) for rowid, row in enumerate(rows, 1)],
+        )
+    with _write_lock:
+        connection.execute("INSERT INTO posts (posts) VALUES ('optimize')")
+        connection.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        print(f"Indexed {rebuild()} posts")
+    elif len(sys.argv) > 2 and sys.argv[1] == "query":
+        for result in search(" ".join(sys.argv[2:])):
+            print(f"{result['score']:.2f}  {result['post_type']}/{result['post_id']}  {result['title']}")
+    else:
+        print("Usage: python search.py rebuild | python search.py query <text>")
+        sys.exit(1)
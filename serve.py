@@ -0,0 +1,53 @@
+import os
+import argparse
+import multiprocessing
+
+# Runs the app with several worker processes on one host:
+#   python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+# or, with gunicorn installed (restarts workers that die or hang):
+#   gunicorn -c gunicorn.conf.py main:app
+# Each worker has its own DB pool, caches and thread/process pools.
+# Listing cache invalidations and thumbnail index changes are shared
+# through pubsub.py; new IDs are reserved on disk (storage.reserve_id), so
+# workers never hand out the same one. Use PUBSUB_BACKEND=redis when the
+# workers run on more than one host.
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# MySQL's default max_connections is 151; keep all workers' pools under it
+MAX_DB_CONNECTIONS = int(os.getenv("MAX_DB_CONNECTIONS", "120"))
+
+
+def default_workers():
+    return int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+
+def configure_workers(workers):
+    """
+    Environment defaults for running `workers` processes; explicit settings win.
+    Must run before the workers import main.
+    """
+    if workers > 1:
+        os.environ.setdefault("PUBSUB_BACKEND", "unix")
+    os.environ.setdefault("DB_POOL_SIZE", str(max(2, min(32, MAX_DB_CONNECTIONS // workers))))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the app with several worker processes")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    configure_workers(args.workers)
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=2048,
+        timeout_keep_alive=5,
+        proxy_headers=True,
+    )
@@ -0,0 +1,194 @@
+import os
+import gzip
+import time
+import asyncio
+import hashlib
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+import responses
+from compress import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Ready-to-send copies of the first SNAPSHOT_PAGES pages of every post
+# type's default listing (/get-posts/{type} and the cursors it links to).
+# Each page is kept serialised and pre-compressed (gzip, plus brotli when
+# installed) with its ETag, so serving one is a dict lookup and a write:
+# no query, no thumbnail lookups and no JSON encoding.
+#
+# A snapshot is tied to the listing cache generation of its type. Every
+# write that invalidates the cache (in this worker or, through the bus or
+# a shared backend, in another) makes it stale at once; stale snapshots
+# are never served and are rebuilt in the background, a moment after the
+# last write of a burst. Pages whose JSON did not change keep their
+# compressed copies, so a rebuild mostly costs the queries. A snapshot is
+# also rebuilt once it is SNAPSHOT_MAX_AGE seconds old, in case an
+# invalidation was lost. A rebuild whose queries fail stores nothing; the
+# listing is served by the regular query path until a rebuild succeeds.
+
+SNAPSHOT_PAGES = int(os.getenv("SNAPSHOT_PAGES", "3"))
+SNAPSHOT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "20"))
+SNAPSHOT_REBUILD_DELAY = float(os.getenv("SNAPSHOT_REBUILD_DELAY", "0.25"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "60"))
+SNAPSHOT_GZIP_LEVEL = int(os.getenv("SNAPSHOT_GZIP_LEVEL", "9"))
+SNAPSHOT_BROTLI_QUALITY = int(os.getenv("SNAPSHOT_BROTLI_QUALITY", "11"))
+# Pages embed absolute URLs, so there is one snapshot per Host the app is
+# reached under; the cap keeps spoofed Host headers from multiplying them
+SNAPSHOT_MAX_BASE_URLS = int(os.getenv("SNAPSHOT_MAX_BASE_URLS", "4"))
+
+
+def serialize(posts):
+    """Same bytes the other JSON responses are encoded to (see responses.py)."""
+    return responses.dumps(posts)
+
+
+class SnapshotPage:
+    """One page: the JSON body, its compressed variants and the cursor of the next page."""
+
+    def __init__(self, body, next_cursor):
+        self.body = body
+        self.next_cursor = next_cursor
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.gzip = gzip.compress(body, compresslevel=SNAPSHOT_GZIP_LEVEL, mtime=0)
+        self.br = brotli.compress(body, quality=SNAPSHOT_BROTLI_QUALITY) if brotli is not None else None
+
+    def encoded(self, accept_encoding):
+        """
+        Returns:
+        - tuple: (bytes to send, Content-Encoding or None)
+        """
+        accepted = accepted_encodings(accept_encoding)
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if "gzip" in accepted or "*" in accepted:
+            return self.gzip, "gzip"
+        return self.body, None
+
+
+class ListingSnapshots:
+    """
+    Parameters:
+    - cache: ResponseCache - its per-type generation decides whether a snapshot is current
+    - load_page: async callable (post_type, base_url, limit, cursor) -> (posts, next_cursor)
+    """
+
+    def __init__(self, cache, load_page, pages=SNAPSHOT_PAGES, page_size=SNAPSHOT_PAGE_SIZE,
+                 max_age=SNAPSHOT_MAX_AGE):
+        self.cache = cache
+        self.load_page = load_page
+        self.pages = pages
+        self.page_size = page_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.failures = 0
+        # (post_type, base_url) -> (generation, {cursor: SnapshotPage}, built at)
+        self._snapshots = {}
+        self._building = {}
+        self._dirty = set()
+        self._loop = None
+
+    def start(self):
+        """Call from the event loop (app startup) before serving."""
+        self._loop = asyncio.get_running_loop()
+        self.cache.add_listener(self.invalidate)
+
+    async def lookup(self, post_type, base_url, cursor=None):
+        """
+        Returns:
+        - Optional[SnapshotPage]: the current page, or None (a stale or missing snapshot is then rebuilt)
+        """
+        key = (post_type, base_url)
+        snapshot = self._snapshots.get(key)
+        if (snapshot is None or snapshot[0] != await self.cache.current_generation(post_type)
+                or time.monotonic() - snapshot[2] > self.max_age):
+            self.misses += 1
+            if key not in self._building:
+                self._schedule(key)
+            return None
+        page = snapshot[1].get(cursor)
+        if page is None:
+            # Deeper than the snapshot reaches
+            self.misses += 1
+            return None
+        self.hits += 1
+        return page
+
+    def invalidate(self, post_type):
+        """Cache listener; may run on any thread."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._schedule_type, post_type)
+
+    def _schedule_type(self, post_type):
+        for key in list(self._snapshots):
+            if key[0] == post_type:
+                self._schedule(key)
+
+    def _schedule(self, key):
+        # Written to while building: build once more when done
+        if key in self._building:
+            self._dirty.add(key)
+            return
+        known = {k for k in (*self._snapshots, *self._building) if k[0] == key[0]}
+        if key not in known and len(known) >= SNAPSHOT_MAX_BASE_URLS:
+            return
+        self._building[key] = asyncio.ensure_future(self._rebuild(key))
+
+    async def _rebuild(self, key):
+        post_type, base_url = key
+        try:
+            # Let a burst of writes settle into one rebuild
+            await asyncio.sleep(SNAPSHOT_REBUILD_DELAY)
+            while True:
+                self._dirty.discard(key)
+                generation = await self.cache.current_generation(post_type)
+                previous = self._snapshots.get(key, (None, {}, 0))[1]
+                pages = {}
+                cursor = None
+                for _ in range(self.pages):
+                    posts, next_cursor = await self.load_page(post_type, base_url, self.page_size, cursor)
+                    body = serialize(posts)
+                    page = previous.get(cursor)
+                    if page is None or page.body != body or page.next_cursor != next_cursor:
+                        page = await run_in_threadpool(SnapshotPage, body, next_cursor)
+                    pages[cursor] = page
+                    if not next_cursor:
+                        break
+                    cursor = next_cursor
+                self._snapshots[key] = (generation, pages, time.monotonic())
+                self.builds += 1
+                if key not in self._dirty:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.error("Rebuilding the %s listing snapshot failed: %s", post_type, e)
+        finally:
+            del self._building[key]
+
+    def shutdown(self):
+        for task in list(self._building.values()):
+            task.cancel()
+
+    def stats(self):
+        return {
+            "snapshots": len(self._snapshots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "builds": self.builds,
+            "failures": self.failures,
+            "bytes": sum(
+                len(page.body) + len(page.gzip) + len(page.br or b"")
+                for _, pages, _ in self._snapshots.values() for page in pages.values()
+            ),
+        }
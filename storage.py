@@ -0,0 +1,441 @@
+import os
+import time
+import uuid
+import string
+import hashlib
+import shutil
+import secrets
+import tempfile
+import threading
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+MB = 1024 * 1024
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1 * MB)))
+# While an upload is being written its folder's mtime is refreshed this
+# often, so reconcile.py (which judges staleness by mtime) never mistakes
+# a long upload for an abandoned one. Keep it well below RECONCILE_GRACE.
+UPLOAD_HEARTBEAT_INTERVAL = float(os.getenv("UPLOAD_HEARTBEAT_INTERVAL", "60"))
+
+# Per-field upload limits in bytes, overridable with MAX_<FIELD>_BYTES
+MAX_UPLOAD_BYTES = {
+    "thumbnail": int(os.getenv("MAX_THUMBNAIL_BYTES", str(10 * MB))),
+    "banner": int(os.getenv("MAX_BANNER_BYTES", str(20 * MB))),
+    "markdown": int(os.getenv("MAX_MARKDOWN_BYTES", str(5 * MB))),
+    "video": int(os.getenv("MAX_VIDEO_BYTES", str(4096 * MB))),
+}
+
+# Allowance on top of the file limits for form fields and multipart framing
+MULTIPART_OVERHEAD_BYTES = int(os.getenv("MULTIPART_OVERHEAD_BYTES", str(1 * MB)))
+
+# Routes taking file fields, with the fields each accepts. update-post takes
+# one field, named in the path, so its limit is looked up per request.
+UPLOAD_ROUTE_FIELDS = {
+    "upload-post": ("thumbnail", "markdown", "banner", "video"),
+}
+
+# update-post path field -> MAX_UPLOAD_BYTES key
+UPDATE_FIELD_LIMITS = {
+    "thumbnails": "thumbnail",
+    "banner": "banner",
+    "markdown": "markdown",
+    "video": "video",
+}
+
+TEMP_SUFFIX = ".part"
+
+# New posts are assembled here and renamed into place when their row commits
+STAGING_DIRNAME = ".staging"
+
+# Marker files that reserve an ID across processes while it is in flight
+RESERVATIONS_DIRNAME = ".reservations"
+
+POST_ID_LENGTH = 15
+THUMBNAIL_ID_LENGTH = 12
+
+# Digits < upper < lower in ASCII, so IDs sort by creation time
+BASE62 = string.digits + string.ascii_uppercase + string.ascii_lowercase
+_TIME_CHARS = 7  # 62**7 ms is ~110 years
+
+_id_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, field, limit):
+        super().__init__(f"{field} exceeds the {limit} byte limit")
+        self.field = field
+        self.limit = limit
+
+
+def request_body_limit(path):
+    """
+    Parameters:
+    - path: request path, e.g. /upload-post/articles
+
+    Returns:
+    - Optional[int]: largest body the route can accept, or None for routes without file fields
+    """
+    parts = path.strip("/").split("/")
+    if parts[0] in UPLOAD_ROUTE_FIELDS:
+        return sum(MAX_UPLOAD_BYTES[field] for field in UPLOAD_ROUTE_FIELDS[parts[0]]) + MULTIPART_OVERHEAD_BYTES
+    if parts[0] == "update-post" and len(parts) > 2:
+        # Unknown fields are refused by the route; never limit them below a real upload
+        key = UPDATE_FIELD_LIMITS.get(parts[2])
+        limit = MAX_UPLOAD_BYTES[key] if key else max(MAX_UPLOAD_BYTES.values())
+        return limit + MULTIPART_OVERHEAD_BYTES
+    return None
+
+
+def _write_chunk(f, digest, chunk):
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _finish(f, tmp_path, dest_path):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(tmp_path, dest_path)
+
+
+def touch(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _discard(f, tmp_path):
+    if not f.closed:
+        f.close()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+async def save_upload_file(upload, dest_path, field, max_bytes=None, heartbeat=None):
+    """
+    Stream an UploadFile to dest_path in UPLOAD_CHUNK_SIZE pieces.
+
+    Data goes to a temp file next to the destination and is renamed into
+    place only once complete, so readers never see a partial file. Writes
+    and hashing run in the threadpool to keep the event loop free.
+
+    Parameters:
+    - upload: UploadFile
+    - dest_path: str (final location of the file)
+    - field: str (form field name, used for the size limit and errors)
+    - max_bytes: int (optional) - overrides MAX_UPLOAD_BYTES[field]
+    - heartbeat: callable (optional) - run every UPLOAD_HEARTBEAT_INTERVAL seconds while
+      writing; defaults to touching the destination folder
+
+    Returns:
+    - tuple: (size in bytes, sha256 hex digest)
+
+    Raises:
+    - UploadTooLarge: if the stream exceeds the limit for the field
+    """
+    limit = max_bytes if max_bytes is not None else MAX_UPLOAD_BYTES.get(field)
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}{TEMP_SUFFIX}"
+    digest = hashlib.sha256()
+    size = 0
+    if heartbeat is None:
+        folder = os.path.dirname(dest_path)
+        heartbeat = lambda: touch(folder)
+    last_beat = time.monotonic()
+
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise UploadTooLarge(field, limit)
+            await run_in_threadpool(_write_chunk, f, digest, chunk)
+            if time.monotonic() - last_beat >= UPLOAD_HEARTBEAT_INTERVAL:
+                await run_in_threadpool(heartbeat)
+                last_beat = time.monotonic()
+        await run_in_threadpool(_finish, f, tmp_path, dest_path)
+    except BaseException:
+        await run_in_threadpool(_discard, f, tmp_path)
+        raise
+
+    metrics.UPLOAD_BYTES.inc(size, field)
+    return size, digest.hexdigest()
+
+
+def _base62(number, width):
+    chars = []
+    for _ in range(width):
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62[remainder])
+    return "".join(reversed(chars))
+
+
+def new_id(length=POST_ID_LENGTH):
+    """
+    Time-ordered random ID: 7 base62 chars of milliseconds followed by random
+    base62 chars. Within one millisecond the random part is incremented, so a
+    process never repeats an ID, and separate processes collide only with
+    negligible probability (callers still create their target atomically).
+    No directory listing is needed.
+    """
+    global _last_ms, _last_random
+    random_chars = length - _TIME_CHARS
+    with _id_lock:
+        now_ms = int(time.time() * 1000)
+        if now_ms <= _last_ms:
+            now_ms = _last_ms
+            _last_random = (_last_random + 1) % (62 ** random_chars)
+        else:
+            _last_random = secrets.randbelow(62 ** random_chars)
+        _last_ms = now_ms
+        return _base62(now_ms, _TIME_CHARS) + _base62(_last_random, random_chars)
+
+
+def uploads_dir():
+    return os.path.abspath(os.path.join(os.getcwd(), "uploads"))
+
+
+def thumbnails_root():
+    return os.path.join(uploads_dir(), "thumbnails")
+
+
+def shard_parts(item_id):
+    """Two levels of 256 directories keyed by a hash of the ID."""
+    digest = hashlib.sha1(item_id.encode("utf-8")).hexdigest()
+    return digest[:2], digest[2:4]
+
+
+def is_shard_name(name):
+    return len(name) == 2 and all(c in "0123456789abcdef" for c in name)
+
+
+def sharded_post_dir(post_type, post_id):
+    return os.path.join(uploads_dir(), post_type, *shard_parts(post_id), post_id)
+
+
+def post_dir(post_type, post_id):
+    """
+    Resolve a post folder, preferring the sharded layout and falling back to
+    the flat uploads/<type>/<id> layout of posts that have not been
+    re-sharded yet. Unknown posts resolve to the sharded location.
+    """
+    sharded = sharded_post_dir(post_type, post_id)
+    if os.path.isdir(sharded):
+        return sharded
+    legacy = os.path.join(uploads_dir(), post_type, post_id)
+    if os.path.isdir(legacy):
+        return legacy
+    # It may have been re-sharded between the two checks
+    return sharded
+
+
+def iter_post_dirs(type_dir):
+    """Yield every post folder under uploads/<type>, sharded or flat."""
+    if not os.path.isdir(type_dir):
+        return
+    for entry in os.scandir(type_dir):
+        if not entry.is_dir() or entry.name.startswith("."):
+            continue
+        if not is_shard_name(entry.name):
+            yield entry.path
+            continue
+        for shard in os.scandir(entry.path):
+            if shard.is_dir():
+                for post in os.scandir(shard.path):
+                    if post.is_dir():
+                        yield post.path
+
+
+def create_post_dir(post_type):
+    """
+    Returns:
+    - tuple: (post_id, path of the newly created, empty post folder)
+    """
+    while True:
+        post_id = new_id(POST_ID_LENGTH)
+        path = sharded_post_dir(post_type, post_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.mkdir(path)
+            return post_id, path
+        except FileExistsError:
+            continue
+
+
+def new_thumbnail_id():
+    return new_id(THUMBNAIL_ID_LENGTH)
+
+
+def thumbnail_relpath(thumbnail_id, extension):
+    """Sharded location of a thumbnail, relative to the thumbnails directory."""
+    return os.path.join(*shard_parts(thumbnail_id), f"{thumbnail_id}{extension}")
+
+
+def thumbnail_path(thumbnail_id, extension):
+    path = os.path.join(thumbnails_root(), thumbnail_relpath(thumbnail_id, extension))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def staging_root():
+    return os.path.join(uploads_dir(), STAGING_DIRNAME)
+
+
+def reservations_root():
+    return os.path.join(uploads_dir(), RESERVATIONS_DIRNAME)
+
+
+def reserve_id(kind, in_use, length):
+    """
+    Pick a new ID and reserve it for every process sharing uploads/ by
+    creating uploads/.reservations/<kind>/<id> with O_EXCL, which is atomic
+    even between hosts on a shared filesystem. in_use(id) rejects IDs that
+    already belong to a published item. Release the reservation with
+    release_id() once the item exists at its final path (or was abandoned);
+    reconcile.py removes reservations left by a crash.
+    """
+    directory = os.path.join(reservations_root(), kind)
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        item_id = new_id(length)
+        try:
+            os.close(os.open(os.path.join(directory, item_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            continue
+        if in_use(item_id):
+            release_id(kind, item_id)
+            continue
+        return item_id
+
+
+def release_id(kind, item_id):
+    try:
+        os.remove(os.path.join(reservations_root(), kind, item_id))
+    except FileNotFoundError:
+        pass
+
+
+def _post_exists(post_type, post_id):
+    return os.path.exists(sharded_post_dir(post_type, post_id)) or os.path.exists(
+        os.path.join(uploads_dir(), post_type, post_id)
+    )
+
+
+def find_thumbnail(thumbnail_id, root=None):
+    """
+    Returns:
+    - Optional[str]: path of the thumbnail file relative to the thumbnails directory, from a
+      scan of its shard folder only
+    """
+    shard = shard_parts(thumbnail_id)
+    try:
+        entries = os.listdir(os.path.join(root or thumbnails_root(), *shard))
+    except FileNotFoundError:
+        return None
+    prefix = f"{thumbnail_id}."
+    for name in entries:
+        if name.startswith(prefix) and not name.endswith(TEMP_SUFFIX):
+            return os.path.join(*shard, name)
+    return None
+
+
+def reserve_post_id(post_type):
+    return reserve_id(post_type, lambda post_id: _post_exists(post_type, post_id), POST_ID_LENGTH)
+
+
+def reserve_thumbnail_id():
+    return reserve_id("thumbnails", lambda thumbnail_id: find_thumbnail(thumbnail_id) is not None, THUMBNAIL_ID_LENGTH)
+
+
+class StagedPost:
+    """
+    The files of a post being uploaded. Everything is written to a private
+    folder under uploads/.staging/ first; publish() then renames the folder
+    into its shard and the thumbnail into the thumbnails tree. Each rename is
+    atomic, so readers see either no post or a complete one, and rollback()
+    undoes whatever part of that already happened. Anything a crash leaves
+    behind is removed later by reconcile.py.
+    """
+
+    def __init__(self, post_type):
+        self.post_type = post_type
+        self.post_id = reserve_post_id(post_type)
+        self.target = sharded_post_dir(post_type, self.post_id)
+        os.makedirs(staging_root(), exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix=f"{post_type}.{self.post_id}.", dir=staging_root())
+        self.thumbnail_id = None
+        self.thumbnail_extension = None
+        self._folder_published = False
+        self._thumbnail_published = False
+
+    def path(self, filename):
+        """Where to write `filename` while staging."""
+        return os.path.join(self.dir, filename)
+
+    def stage_thumbnail(self, extension):
+        """
+        Reserve a thumbnail ID for this post.
+
+        Returns:
+        - tuple: (thumbnail_id, staging path to write it to); publish() moves it to thumbnail_path()
+        """
+        self.thumbnail_id = reserve_thumbnail_id()
+        self.thumbnail_extension = extension
+        return self.thumbnail_id, self.path(f"thumbnail{extension}")
+
+    def heartbeat(self):
+        """Mark the staging folder and the reserved IDs as in use, for reconcile.py."""
+        touch(self.dir)
+        touch(os.path.join(reservations_root(), self.post_type, self.post_id))
+        if self.thumbnail_id is not None:
+            touch(os.path.join(reservations_root(), "thumbnails", self.thumbnail_id))
+
+    def _release_ids(self):
+        release_id(self.post_type, self.post_id)
+        if self.thumbnail_id is not None:
+            release_id("thumbnails", self.thumbnail_id)
+
+    @property
+    def folder(self):
+        """Current location of the post folder."""
+        return self.target if self._folder_published else self.dir
+
+    @property
+    def thumbnail_final_path(self):
+        if self.thumbnail_id is None:
+            return None
+        return os.path.join(thumbnails_root(), thumbnail_relpath(self.thumbnail_id, self.thumbnail_extension))
+
+    def publish(self):
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        os.rename(self.dir, self.target)
+        self._folder_published = True
+        if self.thumbnail_id is not None:
+            os.rename(
+                os.path.join(self.target, f"thumbnail{self.thumbnail_extension}"),
+                thumbnail_path(self.thumbnail_id, self.thumbnail_extension),
+            )
+            self._thumbnail_published = True
+        # Both now exist at their final paths, which keeps the IDs taken
+        self._release_ids()
+
+    def rollback(self):
+        if self._thumbnail_published:
+            try:
+                os.remove(self.thumbnail_final_path)
+            except FileNotFoundError:
+                pass
+            self._thumbnail_published = False
+        if self._folder_published:
+            shutil.rmtree(self.target, ignore_errors=True)
+            self._folder_published = False
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self._release_ids()
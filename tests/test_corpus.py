@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+
+
+def test_export_writer_stops_when_client_disconnects(monkeypatch):
+    monkeypatch.setattr(corpus, "STREAM_POLL_SECONDS", 0.01)
+    finished = threading.Event()
+    raised = []
+
+    def endless_archive(fileobj, post_type, cursor=None, thumbnail_index=None):
+        try:
+            while True:
+                fileobj.write(b"x" * 512)
+        except BaseException as e:
+            raised.append(e)
+            raise
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(corpus, "write_archive", endless_archive)
+    chunks = corpus.stream_archive("articles")
+    assert next(chunks) == b"x" * 512
+    chunks.close()
+
+    assert finished.wait(5)
+    assert isinstance(raised[0], corpus.StreamClosed)
+
+
+def test_import_queue_refuses_chunks_after_import_ends(monkeypatch):
+    monkeypatch.setattr(corpus, "STREAM_POLL_SECONDS", 0.01)
+
+    def failing_read(fileobj, post_type, thumbnail_index=None):
+        raise ValueError("bad archive")
+
+    monkeypatch.setattr(corpus, "read_archive", failing_read)
+    chunks = corpus.new_import_queue()
+    for _ in range(corpus.STREAM_QUEUE_CHUNKS):
+        assert chunks.offer(b"x")
+    try:
+        corpus.import_stream("articles", chunks)
+    except ValueError:
+        pass
+    for _ in range(corpus.STREAM_QUEUE_CHUNKS + 1):
+        assert not chunks.offer(b"x")
+    assert not chunks.offer(None)
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import images
+
+
+def make_renditions(tmp_path):
+    for name in ("320.avif", "320.webp", "320.jpg"):
+        (tmp_path / name).write_bytes(b"")
+    return str(tmp_path)
+
+
+def test_q_zero_excludes_format(tmp_path):
+    out_dir = make_renditions(tmp_path)
+    path, media_type = images.choose_rendition(out_dir, "image/avif;q=0, image/webp, */*;q=0.8", 320)
+    assert media_type == "image/webp"
+    assert path.endswith("320.webp")
+
+
+def test_explicit_types_with_params(tmp_path):
+    out_dir = make_renditions(tmp_path)
+    assert images.choose_rendition(out_dir, "image/avif; q=0.9,image/webp;q=0.5", 320)[1] == "image/avif"
+    assert images.choose_rendition(out_dir, "image/avif;q=0.0, image/webp;q=0", 320)[1] == "image/jpeg"
+    assert images.choose_rendition(out_dir, "*/*", 320)[1] == "image/jpeg"
+
+
+def test_highest_q_wins(tmp_path):
+    out_dir = make_renditions(tmp_path)
+    assert images.choose_rendition(out_dir, "image/avif;q=0.1, image/webp;q=0.9", 320)[1] == "image/webp"
+    assert images.choose_rendition(out_dir, "image/avif;q=0.5, image/jpeg", 320)[1] == "image/jpeg"
+    # Equal q: FORMATS order
+    assert images.choose_rendition(out_dir, "image/webp;q=0.8, image/avif;q=0.8", 320)[1] == "image/avif"
+
+
+def test_jpeg_q_zero_is_respected(tmp_path):
+    out_dir = make_renditions(tmp_path)
+    assert images.choose_rendition(out_dir, "image/jpeg;q=0, image/webp;q=0.2", 320)[1] == "image/webp"
+    assert images.choose_rendition(out_dir, "image/jpeg;q=0", 320) == (None, None)
+    assert images.choose_rendition(out_dir, "image/*;q=0", 320) == (None, None)
+
+
+def test_jpeg_without_accept(tmp_path):
+    out_dir = make_renditions(tmp_path)
+    assert images.choose_rendition(out_dir, None, 320)[1] == "image/jpeg"
+    assert images.choose_rendition(out_dir, "text/html", 320)[1] == "image/jpeg"
+
+
+def test_smallest_wide_enough_rendition(tmp_path):
+    for name in ("160.webp", "640.webp"):
+        (tmp_path / name).write_bytes(b"")
+    path, _ = images.choose_rendition(str(tmp_path), "image/webp", 320)
+    assert path.endswith("640.webp")
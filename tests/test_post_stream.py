@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+from mysql.connector import errors
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import functions
+
+
+class UnreadCursor:
+    """Prepared, unbuffered cursor with rows left: close() fails like mysql-connector's."""
+
+    column_names = ("id", "title")
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def execute(self, query, values):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        if self.rows:
+            raise errors.InternalError("Unread result found")
+
+
+class StreamConnection:
+    def __init__(self, cursor, close_error=None):
+        self._cursor = cursor
+        self.close_error = close_error
+        self.closed = False
+        self.shut_down = False
+
+    def cursor(self, prepared=False):
+        return self._cursor
+
+    def close(self):
+        if self.close_error is not None:
+            raise self.close_error
+        self.closed = True
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+def free_slots():
+    count = 0
+    while functions._stream_slots.acquire(blocking=False):
+        count += 1
+    for _ in range(count):
+        functions._stream_slots.release()
+    return count
+
+
+@pytest.mark.parametrize("close_error", [None, errors.InternalError("Unread result found")])
+def test_client_disconnect_mid_stream_releases_connection(monkeypatch, close_error):
+    connection = StreamConnection(UnreadCursor((str(i), f"title {i}") for i in range(50)), close_error)
+    monkeypatch.setattr(functions, "get_streaming_connection", lambda: connection)
+    slots = free_slots()
+
+    stream = functions.PostStream("articles", limit=50, fetch_size=10)
+    assert free_slots() == slots - 1
+    batches = stream.batches()
+    assert [row["id"] for row in next(batches)] == [str(i) for i in range(10)]
+    # What the response does when the client goes away: the generator is closed early
+    batches.close()
+
+    assert connection.closed or connection.shut_down
+    assert connection.shut_down == (close_error is not None)
+    assert free_slots() == slots
+    stream.close()
+    assert free_slots() == slots
+
+
+def test_exhausted_stream_closes_connection(monkeypatch):
+    connection = StreamConnection(UnreadCursor((str(i), "t") for i in range(25)))
+    monkeypatch.setattr(functions, "get_streaming_connection", lambda: connection)
+
+    stream = functions.PostStream("articles", limit=25, fetch_size=10)
+    assert sum(len(batch) for batch in stream.batches()) == 25
+    assert connection.closed
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resumable
+
+
+def test_chunk_writes_refused_after_finalize(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = resumable.initiate_upload("tutorials", "v.mp4", 10, chunk_size=10)
+    upload_id = manifest["upload_id"]
+    _, fd, offset, length = resumable.open_chunk_writer(upload_id, 0)
+    resumable.write_at(fd, b"0123456789", offset)
+    resumable.commit_chunk(upload_id, fd, 0)
+
+    post_folder = tmp_path / "post"
+    post_folder.mkdir()
+    _, video_path = resumable.finalize_upload(upload_id, "tutorials", str(post_folder))
+
+    with pytest.raises(resumable.ResumableUploadError) as excinfo:
+        resumable.open_chunk_writer(upload_id, 0)
+    assert excinfo.value.status_code == 409
+    # Finalizing again, e.g. after a failed insert, still works
+    resumable.finalize_upload(upload_id, "tutorials", str(post_folder))
+    with open(video_path, "rb") as f:
+        assert f.read() == b"0123456789"
@@ -0,0 +1,45 @@
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search
+
+
+def use_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_DB_PATH", str(tmp_path / "search.db"))
+    monkeypatch.setattr(search, "_local", type(search._local)())
+
+
+def test_writes_go_through_post_rows(tmp_path, monkeypatch):
+    use_index(tmp_path, monkeypatch)
+    search.index_post("articles", "a1", "Hello world", "first", "ada", body="body one")
+    search.index_post("guides", "a1", "Hello guide", "second", "bob", body="body two")
+    search.index_post("articles", "a1", "Hello again", "first", "ada", body="body one")
+
+    assert [r["title"] for r in search.search("hello", "articles")] == ["Hello again"]
+    search.update_post_fields("articles", "a1", title="Renamed")
+    search.update_posts_fields("guides", [("a1", "author", "carol")])
+    assert search.search("renamed")[0]["post_type"] == "articles"
+    assert search.search("carol")[0]["post_type"] == "guides"
+
+    search.remove_posts("articles", ["a1"])
+    assert [r["post_type"] for r in search.search("body")] == ["guides"]
+    connection = search.get_connection()
+    assert connection.execute("SELECT COUNT(*) FROM post_rows").fetchone()[0] == 1
+
+
+def test_existing_index_is_mapped_on_open(tmp_path, monkeypatch):
+    path = tmp_path / "search.db"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE VIRTUAL TABLE posts USING fts5(post_id UNINDEXED, post_type UNINDEXED, title, description, author, body)"
+    )
+    connection.execute("INSERT INTO posts VALUES ('a1', 'articles', 'Old', '', '', '')")
+    connection.commit()
+    connection.close()
+
+    use_index(tmp_path, monkeypatch)
+    search.remove_post("articles", "a1")
+    assert search.search("old") == []
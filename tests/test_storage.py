@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import posttypes
+import storage
+
+
+@pytest.mark.parametrize("field, key", [
+    ("thumbnails", "thumbnail"),
+    ("banner", "banner"),
+    ("markdown", "markdown"),
+    ("video", "video"),
+])
+def test_update_limit_per_field(field, key):
+    limit = storage.request_body_limit(f"/update-post/articles/{field}/abc")
+    assert limit == storage.MAX_UPLOAD_BYTES[key] + storage.MULTIPART_OVERHEAD_BYTES
+
+
+def test_every_update_file_field_has_a_limit():
+    for post_type in posttypes.REGISTRY.values():
+        for field in post_type.file_fields:
+            assert field in storage.UPDATE_FIELD_LIMITS
+
+
+def test_unknown_update_field_is_not_limited_to_overhead():
+    limit = storage.request_body_limit("/update-post/articles/unknown/abc")
+    assert limit == max(storage.MAX_UPLOAD_BYTES.values()) + storage.MULTIPART_OVERHEAD_BYTES
+
+
+def test_routes_without_files_have_no_limit():
+    assert storage.request_body_limit("/get-posts/articles") is None